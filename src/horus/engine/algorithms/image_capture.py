@@ -6,6 +6,8 @@ __copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
 __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
 
 import cv2
+import time
+import numpy as np
 
 from horus import Singleton
 from horus.engine.driver.driver import Driver
@@ -50,6 +52,40 @@ class CameraSettings(object):
         self.driver.camera.set_exposure(self.exposure)
 
 
+class BackgroundModel(object):
+
+    """Laser-off frame reused as background for the next laser captures.
+       It is refreshed every refresh captures or when the blue channel
+       of a laser frame differs from it (ambient light change)"""
+
+    def __init__(self, refresh=1, threshold=30, tolerance=0.02):
+        self.refresh = refresh
+        self.threshold = threshold
+        self.tolerance = tolerance
+        self.reset()
+
+    def reset(self):
+        self.image = None
+        self._age = 0
+
+    def get(self):
+        """Return the background or None if it has to be captured"""
+        if self.image is None or self._age >= self.refresh:
+            return None
+        self._age += 1
+        return self.image
+
+    def update(self, image):
+        self.image = image
+        self._age = 1
+
+    def check(self, image):
+        if self.image is not None and image is not None:
+            diff = cv2.absdiff(image[::4, ::4, 2], self.image[::4, ::4, 2])
+            if np.count_nonzero(diff > self.threshold) > self.tolerance * diff.size:
+                self.reset()
+
+
 @Singleton
 class ImageCapture(object):
 
@@ -67,6 +103,10 @@ class ImageCapture(object):
         self._remove_background = True
         self._updating = False
         self.use_distortion = False
+        self.undistort_points = False
+        self._motion = None
+        self.background_model = BackgroundModel()
+        self._use_background_model = False
 
     def initialize(self):
         self.texture_mode.initialize()
@@ -83,12 +123,39 @@ class ImageCapture(object):
         self._flush_stream_laser = laser
         self._flush_stream_pattern = pattern
 
+    def set_settle_values(self, texture, laser, pattern):
+        # Measured frames to settle after a switch. The stream keeps
+        # the mode between captures: only the laser switch applies
+        self.set_flush_values(texture, laser, pattern)
+        self._flush_stream_laser = laser
+
     def set_use_distortion(self, value):
         self.use_distortion = value
 
+    def set_undistort_points(self, value):
+        # Keep frames raw: distortion is corrected on the extracted points
+        self.undistort_points = value
+
+    def set_motion(self, wait):
+        # The next capture calls wait() before the exposure that needs the
+        # platform stationary. With the camera grabber, the settle frames
+        # are counted from the motion end
+        self._motion = wait
+
     def set_remove_background(self, value):
         self._remove_background = value
 
+    def set_background_refresh(self, value):
+        self.background_model.refresh = value
+
+    def set_use_background_model(self, value):
+        # Only while scanning: the scene does not change between steps
+        self._use_background_model = value
+        self.background_model.reset()
+
+    def get_remove_background(self):
+        return self._remove_background
+
     def set_mode(self, mode):
         if self._mode is not mode:
             self._updating = True
@@ -140,18 +207,26 @@ class ImageCapture(object):
         self.driver.board.laser_off(index)
         return image
 
+    def _capture_background(self):
+        image = None
+        if self._use_background_model:
+            image = self.background_model.get()
+        if image is None:
+            self.driver.board.lasers_off()
+            image = self.capture_image(flush=self.get_flush_laser())
+            if self._use_background_model:
+                self.background_model.update(image)
+        return image
+
     def capture_laser(self, index):
         # Capture background
         image_background = None
         if self._remove_background:
-            self.driver.board.lasers_off()
-            if self.stream:
-                flush = self._flush_stream_laser
-            else:
-                flush = self._flush_laser
-            image_background = self.capture_image(flush=flush)
+            image_background = self._capture_background()
         # Capture laser
         image = self._capture_laser(index)
+        if self._use_background_model:
+            self.background_model.check(image)
         if image_background is not None:
             if image is not None:
                 image = cv2.subtract(image, image_background)
@@ -161,16 +236,13 @@ class ImageCapture(object):
         # Capture background
         image_background = None
         if self._remove_background:
-            self.driver.board.lasers_off()
-            if self.stream:
-                flush = self._flush_stream_laser
-            else:
-                flush = self._flush_laser
-            image_background = self.capture_image(flush=flush)
+            image_background = self._capture_background()
         # Capture lasers
         images = [None, None]
         images[0] = self._capture_laser(0)
         images[1] = self._capture_laser(1)
+        if self._use_background_model:
+            self.background_model.check(images[0])
         if image_background is not None:
             if images[0] is not None:
                 images[0] = cv2.subtract(images[0], image_background)
@@ -178,6 +250,22 @@ class ImageCapture(object):
                 images[1] = cv2.subtract(images[1], image_background)
         return images
 
+    def capture_laser_frame(self, lasers):
+        """Switch the lasers to the given state and capture a laser mode frame"""
+        self.set_mode(self.laser_mode)
+        for i, enabled in enumerate(lasers):
+            if enabled:
+                self.driver.board.laser_on(i)
+            else:
+                self.driver.board.laser_off(i)
+        return self.capture_image(flush=self.get_flush_laser())
+
+    def get_flush_laser(self):
+        if self.stream:
+            return self._flush_stream_laser
+        else:
+            return self._flush_laser
+
     def capture_all_lasers(self):
         image_background = None
         self.set_mode(self.laser_mode)
@@ -186,16 +274,44 @@ class ImageCapture(object):
         else:
             flush = self._flush_laser
         if self._remove_background:
-            self.driver.board.lasers_off()
-            image_background = self.capture_image(flush=flush)
+            image_background = self._capture_background()
         self.driver.board.lasers_on()
         image = self.capture_image(flush=flush)
         self.driver.board.lasers_off()
+        if self._use_background_model:
+            self.background_model.check(image)
         if image_background is not None:
             if image is not None and image_background is not None:
                 image = cv2.subtract(image, image_background)
         return image
 
+    def capture_lasers_split(self, center_u):
+        """Capture both lasers in one frame and split it at the column center_u.
+           Each laser line lies on one side of the platform center"""
+        return self.split_lasers(self.capture_all_lasers(), center_u)
+
+    def split_lasers(self, image, center_u):
+        images = [None, None]
+        if image is not None:
+            left = np.zeros_like(image)
+            left[:, :center_u] = image[:, :center_u]
+            right = np.zeros_like(image)
+            right[:, center_u:] = image[:, center_u:]
+            if self._laser_side(0) <= self._laser_side(1):
+                images = [left, right]
+            else:
+                images = [right, left]
+        return images
+
+    def _laser_side(self, index):
+        # Sign of the laser plane x coordinate at the camera depth:
+        # negative for the laser seen on the left of the image
+        plane = self.calibration_data.laser_planes[index]
+        if plane.normal is not None and plane.distance is not None and \
+           plane.normal[0] != 0:
+            return np.sign(plane.distance / plane.normal[0])
+        return -1 if index == 0 else 1
+
     def capture_pattern(self):
         self.set_mode(self.pattern_mode)
         if self.stream:
@@ -206,8 +322,11 @@ class ImageCapture(object):
         return image
 
     def capture_image(self, flush=0):
-        image = self.driver.camera.capture_image(flush=flush)
-        if self.use_distortion:
+        if self._motion is None:
+            image = self.driver.camera.capture_image(flush=flush)
+        else:
+            image = self._capture_after_motion(flush)
+        if self.use_distortion and not self.undistort_points:
             if image is not None and \
                self.calibration_data.camera_matrix is not None and \
                self.calibration_data.distortion_vector is not None and \
@@ -218,3 +337,13 @@ class ImageCapture(object):
                                       None,
                                       self.calibration_data.dist_camera_matrix)
         return image
+
+    def _capture_after_motion(self, flush):
+        wait, self._motion = self._motion, None
+        wait()
+        if not self.driver.camera.is_grabbing():
+            # Without timestamps, the buffered frames may be taken during
+            # the motion: flush them all after it
+            return self.driver.camera.capture_image(flush=flush)
+        # First frame exposed flush frame periods after the motion end
+        return self.driver.camera.capture_image(flush=flush, after=time.time())
@@ -8,7 +8,6 @@ __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.ht
 import cv2
 import math
 import numpy as np
-import scipy.ndimage
 
 from horus import Singleton
 from horus.engine.calibration.calibration_data import CalibrationData
@@ -30,6 +29,7 @@ class LaserSegmentation(object):
         self.window_enable = False
         self.window_value = 0
         self.refinement_method = 'SGF'
+        self.fused_enable = False
 
     def set_red_channel(self, value):
         self.red_channel = value
@@ -55,13 +55,20 @@ class LaserSegmentation(object):
     def set_refinement_method(self, value):
         self.refinement_method = value
 
+    def set_fused_enable(self, value):
+        self.fused_enable = value
+
     def compute_2d_points(self, image):
         if image is not None:
-            image = self.compute_line_segmentation(image)
-            # Peak detection: center of mass
-            s = image.sum(axis=1)
-            v = np.where(s > 0)[0]
-            u = (self.calibration_data.weight_matrix * image).sum(axis=1)[v] / s[v]
+            if self.fused_enable:
+                (u, v, s), image = self._fused_center_of_mass(image)
+            else:
+                image = self.compute_line_segmentation(image)
+                # Peak detection: center of mass
+                s = image.sum(axis=1)
+                v = np.where(s > 0)[0]
+                h, w = image.shape
+                u = (self.calibration_data.weight_matrix[:h, :w] * image).sum(axis=1)[v] / s[v]
             if self.refinement_method == 'SGF':
                 # Segmented gaussian filter
                 u, v = self._sgf(u, v, s)
@@ -95,9 +102,17 @@ class LaserSegmentation(object):
                 image = self._window_mask(image)
             return image
 
+    def compute_red_channel(self, image):
+        """Single channel laser image. Segmentation accepts it as input"""
+        if image is not None:
+            return self._obtain_red_channel(image)
+
     def _obtain_red_channel(self, image):
         ret = None
-        if self.red_channel == 'R (RGB)':
+        if image.ndim == 2:
+            # Channel already obtained
+            ret = image
+        elif self.red_channel == 'R (RGB)':
             ret = cv2.split(image)[0]
         elif self.red_channel == 'Cr (YCrCb)':
             ret = cv2.split(cv2.cvtColor(image, cv2.COLOR_RGB2YCR_CB))[1]
@@ -121,31 +136,88 @@ class LaserSegmentation(object):
             _min = peak - self.window_value
             _max = peak + self.window_value + 1
             mask = np.zeros_like(image)
-            for i in xrange(self.calibration_data.height):
+            for i in xrange(image.shape[0]):
                 mask[i, _min[i]:_max[i]] = 255
             # Apply mask
             image = cv2.bitwise_and(image, mask)
         return image
 
+    # Fused line extraction
+
+    def _fused_center_of_mass(self, image):
+        """Line segmentation and center of mass in a single pass.
+           Same result as compute_line_segmentation + center of mass, without
+           channel split, per row loop and full frame float temporaries"""
+        if image.ndim == 2:
+            image = image.copy()
+        elif self.red_channel == 'R (RGB)':
+            image = np.ascontiguousarray(image[:, :, 0])
+        else:
+            image = np.ascontiguousarray(self._obtain_red_channel(image))
+        if self.threshold_enable:
+            # Thresholding twice is only needed around the blur
+            cv2.threshold(image, self.threshold_value, 255, cv2.THRESH_TOZERO, dst=image)
+            if self.blur_enable:
+                image = cv2.blur(image, (self.blur_value, self.blur_value))
+                cv2.threshold(image, self.threshold_value, 255, cv2.THRESH_TOZERO, dst=image)
+        if self.window_enable:
+            h, w = image.shape
+            rows = np.arange(h)[:, np.newaxis]
+            peak = image.argmax(axis=1)
+            cols = peak[:, np.newaxis] + np.arange(-self.window_value, self.window_value + 1)
+            # Same bounds as the slice mask[i, _min:_max]: negative starts wrap around
+            _min = peak - self.window_value
+            _min = np.where(_min < 0, np.maximum(_min + w, 0), _min)
+            _max = np.minimum(peak + self.window_value + 1, w)
+            valid = (cols >= _min[:, np.newaxis]) & (cols < _max[:, np.newaxis])
+            band = image[rows, np.clip(cols, 0, w - 1)]
+            band *= valid
+            s = band.sum(axis=1)
+            v = np.where(s > 0)[0]
+            u = (band * cols).sum(axis=1)[v] / s[v].astype(np.float64)
+            # Segmented image
+            i, j = np.nonzero(valid)
+            image = np.zeros_like(image)
+            image[i, cols[i, j]] = band[i, j]
+        else:
+            s = image.sum(axis=1)
+            v = np.where(s > 0)[0]
+            weights = np.arange(image.shape[1])
+            u = np.einsum('ij,j->i', image, weights)[v] / s[v].astype(np.float64)
+        return (u, v, s), image
+
     # Segmented gaussian filter
 
     def _sgf(self, u, v, s):
         if len(u) > 1:
-            i = 0
+            n = len(u)
             sigma = 2.0
-            f = np.array([])
-            segments = [s[_r] for _r in np.ma.clump_unmasked(np.ma.masked_equal(s, 0))]
-            # Detect stripe segments
-            for segment in segments:
-                j = len(segment)
-                # Apply gaussian filter
-                fseg = scipy.ndimage.gaussian_filter(u[i:i + j], sigma=sigma)
-                f = np.concatenate((f, fseg))
-                i += j
+            weights = self._gaussian_weights(sigma)
+            radius = len(weights) // 2
+            # Detect stripe segments: runs of consecutive rows
+            begin = np.ones(n, dtype=bool)
+            begin[1:] = np.diff(v) > 1
+            starts = np.flatnonzero(begin)
+            lengths = np.diff(np.append(starts, n))
+            segment = np.cumsum(begin) - 1
+            start = starts[segment][:, np.newaxis]
+            length = lengths[segment][:, np.newaxis]
+            # Apply gaussian filter to all segments. Each tap is reflected
+            # inside its own segment ('reflect' mode of scipy.ndimage)
+            taps = np.arange(n)[:, np.newaxis] - start + np.arange(-radius, radius + 1)
+            taps %= 2 * length
+            taps = np.where(taps >= length, 2 * length - 1 - taps, taps)
+            f = u[start + taps].dot(weights)
             return f, v
         else:
             return u, v
 
+    def _gaussian_weights(self, sigma, truncate=4.0):
+        radius = int(truncate * sigma + 0.5)
+        x = np.arange(-radius, radius + 1)
+        weights = np.exp(-0.5 * x * x / (sigma * sigma))
+        return weights / weights.sum()
+
     # RANSAC implementation: https://github.com/ahojnnes/numpy-snippets/blob/master/ransac.py
 
     def _ransac(self, u, v):
@@ -5,7 +5,8 @@ __author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
 __copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
 __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
 
-
+import cv2
+import math
 import numpy as np
 
 from horus import Singleton
@@ -17,23 +18,75 @@ class PointCloudGeneration(object):
 
     def __init__(self):
         self.calibration_data = CalibrationData()
+        self.scan_context = ScanContext(self.calibration_data)
 
     def compute_point_cloud(self, theta, points_2d, index):
-        # Load calibration values
-        R = np.matrix(self.calibration_data.platform_rotation)
-        t = np.matrix(self.calibration_data.platform_translation).T
+        # Compile triangulation tables if calibration has changed
+        self.scan_context.update()
         # Compute platform transformation
-        Xwo = self.compute_platform_point_cloud(points_2d, R, t, index)
+        Xwo = self.scan_context.compute_platform_point_cloud(points_2d, index)
         # Rotate to world coordinates
-        c, s = np.cos(-theta), np.sin(-theta)
-        Rz = np.matrix([[c, -s, 0], [s, c, 0], [0, 0, 1]])
-        Xw = Rz * Xwo
+        c, s = math.cos(-theta), math.sin(-theta)
+        Xw = np.empty_like(Xwo)
+        Xw[0] = c * Xwo[0] - s * Xwo[1]
+        Xw[1] = s * Xwo[0] + c * Xwo[1]
+        Xw[2] = Xwo[2]
         # Return point cloud
         if Xw.size > 0:
-            return np.array(Xw)
+            return Xw
         else:
             return None
 
+    def undistort_points(self, points_2d):
+        """Correct the lens distortion of raw 2D points. Same coordinates
+           as the points extracted from an undistorted frame"""
+        u, v = points_2d
+        if len(u) > 0 and \
+           self.calibration_data.camera_matrix is not None and \
+           self.calibration_data.distortion_vector is not None and \
+           self.calibration_data.dist_camera_matrix is not None:
+            points = np.array((u, v), np.float64).T.reshape(-1, 1, 2)
+            points = cv2.undistortPoints(points,
+                                         self.calibration_data.camera_matrix,
+                                         self.calibration_data.distortion_vector,
+                                         P=self.calibration_data.dist_camera_matrix)
+            points = points.reshape(-1, 2).T
+            return points[0], points[1]
+        else:
+            return u, v
+
+    def project_point_cloud(self, point_cloud, theta, distort=False):
+        """Image coordinates of a world point cloud with the platform at theta.
+           With distort, the coordinates of undistorted points are mapped
+           back to the raw frame"""
+        # Rotate to platform coordinates
+        c, s = math.cos(theta), math.sin(theta)
+        Xwo = np.empty_like(point_cloud)
+        Xwo[0] = c * point_cloud[0] - s * point_cloud[1]
+        Xwo[1] = s * point_cloud[0] + c * point_cloud[1]
+        Xwo[2] = point_cloud[2]
+        # Camera system: inverse of the platform transformation
+        R = np.asarray(self.calibration_data.platform_rotation, np.float64)
+        t = np.asarray(self.calibration_data.platform_translation, np.float64).ravel()
+        Xc = np.linalg.inv(R.T).dot(Xwo) + t[:, np.newaxis]
+        fx = self.calibration_data.camera_matrix[0][0]
+        fy = self.calibration_data.camera_matrix[1][1]
+        cx = self.calibration_data.camera_matrix[0][2]
+        cy = self.calibration_data.camera_matrix[1][2]
+        u = fx * Xc[0] / Xc[2] + cx
+        v = fy * Xc[1] / Xc[2] + cy
+        if distort and len(u) > 0 and \
+           self.calibration_data.distortion_vector is not None and \
+           self.calibration_data.dist_camera_matrix is not None:
+            K = self.calibration_data.dist_camera_matrix
+            x = np.array(((u - K[0][2]) / K[0][0], (v - K[1][2]) / K[1][1], np.ones(len(u))))
+            points, _ = cv2.projectPoints(x.T.reshape(-1, 1, 3), np.zeros(3), np.zeros(3),
+                                          np.asarray(self.calibration_data.camera_matrix),
+                                          self.calibration_data.distortion_vector)
+            points = points.reshape(-1, 2).T
+            u, v = points[0], points[1]
+        return u, v
+
     def compute_platform_point_cloud(self, points_2d, R, t, index):
         # Load calibration values
         n = self.calibration_data.laser_planes[index].normal
@@ -54,3 +107,84 @@ class PointCloudGeneration(object):
         x = np.concatenate(((u - cx) / fx, (v - cy) / fy, np.ones(len(u)))).reshape(3, len(u))
         # Compute laser intersection
         return d / np.dot(n, x) * x
+
+
+class ScanContext(object):
+
+    """Triangulation tables compiled from the calibration values.
+
+    Camera intrinsics, laser planes and platform extrinsics are fixed during
+    a scan, so the ray of each image row and its laser plane intersection are
+    precomputed in platform coordinates:
+
+        Xwo = d / (plane_v[v] + u * plane_u) * (ray_v[v] + u * ray_u) + offset
+
+    Rows are linear in v, so non integer rows (undistorted points) are
+    computed from the row slopes instead of the tables.
+    """
+
+    def __init__(self, calibration_data):
+        self.calibration_data = calibration_data
+        self._signature = None
+        self._ray_u = None
+        self._ray_v = None
+        self._ray_dv = None
+        self._offset = None
+        self._planes = [None, None]
+
+    def update(self):
+        signature = self._compute_signature()
+        if signature != self._signature:
+            self._compile()
+            self._signature = signature
+
+    def compute_platform_point_cloud(self, points_2d, index):
+        u, v = points_2d
+        u = np.asarray(u, np.float32)
+        distance, plane_u, plane_v, plane_dv = self._planes[index]
+        if np.issubdtype(np.asarray(v).dtype, np.integer):
+            ray_v = self._ray_v[:, v]
+            plane_v = plane_v[v]
+        else:
+            v = np.asarray(v, np.float32)
+            ray_v = self._ray_v[:, :1] + v * self._ray_dv
+            plane_v = plane_v[0] + v * plane_dv
+        scale = distance / (plane_v + u * plane_u)
+        return scale * (ray_v + u * self._ray_u) + self._offset
+
+    def _compile(self):
+        # Load calibration values
+        fx = self.calibration_data.camera_matrix[0][0]
+        fy = self.calibration_data.camera_matrix[1][1]
+        cx = self.calibration_data.camera_matrix[0][2]
+        cy = self.calibration_data.camera_matrix[1][2]
+        R = np.asarray(self.calibration_data.platform_rotation, np.float64)
+        t = np.asarray(self.calibration_data.platform_translation, np.float64).ravel()
+        # Camera ray of each row: x = (u - cx) / fx, y = (v - cy) / fy, z = 1
+        y = (np.arange(self.calibration_data.height) - cy) / fy
+        x = np.array([-cx / fx * np.ones_like(y), y, np.ones_like(y)])
+        # Rays and offset in platform coordinates
+        self._ray_u = (R.T[:, 0] / fx).astype(np.float32)[:, np.newaxis]
+        self._ray_v = R.T.dot(x).astype(np.float32)
+        self._ray_dv = (R.T[:, 1] / fy).astype(np.float32)[:, np.newaxis]
+        self._offset = (-R.T.dot(t)).astype(np.float32)[:, np.newaxis]
+        # Laser plane intersection of each row
+        for i, plane in enumerate(self.calibration_data.laser_planes):
+            if plane.normal is None or plane.distance is None:
+                self._planes[i] = None
+            else:
+                n = np.asarray(plane.normal, np.float64)
+                self._planes[i] = (np.float32(plane.distance),
+                                   np.float32(n[0] / fx),
+                                   n.dot(x).astype(np.float32),
+                                   np.float32(n[1] / fy))
+
+    def _compute_signature(self):
+        values = [self.calibration_data.camera_matrix,
+                  self.calibration_data.platform_rotation,
+                  self.calibration_data.platform_translation]
+        for plane in self.calibration_data.laser_planes:
+            values += [plane.normal, plane.distance]
+        return (self.calibration_data.height,) + tuple(
+            None if value is None else np.asarray(value, np.float64).tostring()
+            for value in values)
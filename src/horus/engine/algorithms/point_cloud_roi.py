@@ -59,6 +59,16 @@ class PointCloudROI(object):
     def set_show_center(self, value):
         self._show_center = value
 
+    def get_center_u(self):
+        """Image column of the platform center, None if not computed"""
+        if self._center_u != 0:
+            return self._center_u
+
+    def get_roi(self):
+        """Image bounds (umin, umax, vmin, vmax) of the ROI, None if not used"""
+        if self._center_v != 0 and self._center_u != 0 and self._use_roi:
+            return self._umin, self._umax, self._vmin, self._vmax
+
     def mask_image(self, image):
         if self._center_v != 0 and self._center_u != 0 and self._use_roi:
             if image is not None:
@@ -104,6 +104,7 @@ class Autocheck(Calibration):
             if self._progress_callback is not None:
                 self._progress_callback(i / 3.6)
             self.driver.board.motor_move(scan_step)
+            self.driver.board.motor_wait()
 
         # Check pattern detection
         if len(patterns_detected) == 0:
@@ -131,6 +132,7 @@ class Autocheck(Calibration):
         if pos > 180:
             pos = pos - 360
         self.driver.board.motor_move(pos)
+        self.driver.board.motor_wait()
 
     def check_lasers(self):
         image = self.image_capture.capture_pattern()
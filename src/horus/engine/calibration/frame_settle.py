@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+import cv2
+import numpy as np
+
+from horus import Singleton
+from horus.engine.calibration.calibration import Calibration, CalibrationCancel
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def frame_change(image, reference, threshold=30):
+    """Fraction of pixels that differ from the reference frame"""
+    diff = cv2.absdiff(image[::4, ::4], reference[::4, ::4]).max(axis=2)
+    return np.count_nonzero(diff > threshold) / float(diff.size)
+
+
+def settle_frames(frames, tolerance=0.001):
+    """Number of frames to discard until the sequence matches its last frame"""
+    reference = frames[-1]
+    for i, frame in enumerate(frames[:-1]):
+        if frame_change(frame, reference) <= tolerance:
+            return i
+    return len(frames) - 1
+
+
+@Singleton
+class FrameSettle(Calibration):
+
+    """Frame settle calibration. Measures the number of frames that the
+       camera needs to show a mode (exposure) or laser switch. The values
+       replace the flush values of the image capture:
+
+            - Texture: switch from laser to texture mode
+            - Laser: laser switch and switch from pattern to laser mode
+            - Pattern: switch from texture to pattern mode
+    """
+
+    def __init__(self):
+        Calibration.__init__(self)
+        self.frames = 10
+        self.repetitions = 2
+        self.result = None
+
+    def _start(self):
+        ret = False
+        response = None
+        if self.driver.is_connected:
+            stream = self.image_capture.stream
+            self.image_capture.stream = False
+            try:
+                self.result = self.measure()
+                ret = True
+                response = self.result
+            except Exception as exception:
+                response = exception
+            finally:
+                self._is_calibrating = False
+                self.image_capture.stream = stream
+                self.driver.board.lasers_off()
+                if self._progress_callback is not None:
+                    self._progress_callback(100)
+        if self._after_callback is not None:
+            self._after_callback((ret, response))
+
+    def measure(self):
+        texture, laser, pattern = 0, 0, 0
+        board = self.driver.board
+        for i in xrange(self.repetitions):
+            self.image_capture.set_mode_pattern()
+            self._frames()
+            laser = max(laser, self._settle(self.image_capture.set_mode_laser))
+            board.lasers_off()
+            self._frames()
+            laser = max(laser, self._settle(lambda: board.laser_on(i % 2)))
+            laser = max(laser, self._settle(board.lasers_off))
+            texture = max(texture, self._settle(self.image_capture.set_mode_texture))
+            pattern = max(pattern, self._settle(self.image_capture.set_mode_pattern))
+            if self._progress_callback is not None:
+                self._progress_callback(100 * (i + 1) / self.repetitions)
+        logger.info("Frame settle: texture {0}, laser {1}, pattern {2}".format(
+            texture, laser, pattern))
+        return texture, laser, pattern
+
+    def _settle(self, switch):
+        switch()
+        return settle_frames(self._frames())
+
+    def _frames(self):
+        frames = []
+        for i in xrange(self.frames):
+            if not self._is_calibrating:
+                raise CalibrationCancel()
+            image = self.driver.camera.capture_image()
+            if image is not None:
+                frames.append(image)
+        if len(frames) == 0:
+            raise CalibrationCancel()
+        return frames
@@ -5,10 +5,10 @@ __author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
 __copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
 __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
 
-import struct
 import numpy as np
 
 from horus import Singleton
+from horus.util.mesh_loaders import ply
 from horus.engine.calibration.calibration import CalibrationCancel
 from horus.engine.calibration.moving_calibration import MovingCalibration
 
@@ -185,19 +185,6 @@ def save_point_cloud(filename, point_cloud):
 
 
 def save_point_cloud_stream(stream, point_cloud):
-    frame = "ply\n"
-    frame += "format binary_little_endian 1.0\n"
-    frame += "comment Generated by Horus software\n"
-    frame += "element vertex {0}\n".format(len(point_cloud))
-    frame += "property float x\n"
-    frame += "property float y\n"
-    frame += "property float z\n"
-    frame += "property uchar red\n"
-    frame += "property uchar green\n"
-    frame += "property uchar blue\n"
-    frame += "element face 0\n"
-    frame += "property list uchar int vertex_indices\n"
-    frame += "end_header\n"
-    for point in point_cloud:
-        frame += struct.pack("<fffBBB", point[0], point[1], point[2], 255, 0, 0)
-    stream.write(frame)
+    colors = np.empty((len(point_cloud), 3), np.uint8)
+    colors[:] = (255, 0, 0)
+    ply.write_ply(stream, point_cloud, colors, comment="Generated by Horus software")
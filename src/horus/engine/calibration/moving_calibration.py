@@ -5,7 +5,6 @@ __author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
 __copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
 __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
 
-import time
 from horus.engine.calibration.calibration import Calibration
 
 
@@ -46,6 +45,7 @@ class MovingCalibration(Calibration):
 
             # Move to starting position
             self.driver.board.motor_move(-90)
+            self.driver.board.motor_wait()
 
             if self._progress_callback is not None:
                 self._progress_callback(0)
@@ -59,7 +59,7 @@ class MovingCalibration(Calibration):
 
                 angle += self.step
                 self.driver.board.motor_move(self.step)
-                time.sleep(0.5)
+                self.driver.board.motor_wait()
 
             # Move to origin
             self.driver.board.motor_move(90 - angle)
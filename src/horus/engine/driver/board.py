@@ -6,11 +6,13 @@ __copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
 __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
 
 import time
+import math
 import glob
 import serial
-import threading
 import platform
 
+from horus.engine.driver.channel import GcodeChannel, CommandFuture, CommandExecutor
+
 import logging
 logger = logging.getLogger(__name__)
 
@@ -35,6 +37,42 @@ class OldFirmware(Exception):
         Exception.__init__(self, "Old Firmware")
 
 
+def motion_time(distance, speed, acceleration):
+    """Duration of a move with a trapezoidal speed profile"""
+    distance = abs(distance)
+    speed, acceleration = float(speed), float(acceleration)
+    if speed <= 0:
+        return 0.
+    elif acceleration <= 0:
+        return distance / speed
+    elif distance >= speed ** 2 / acceleration:
+        return distance / speed + speed / acceleration
+    else:
+        return 2 * math.sqrt(distance / acceleration)
+
+
+def motion_distance(elapsed, distance, speed, acceleration):
+    """Distance covered after elapsed time in a move with a trapezoidal speed profile"""
+    total = abs(distance)
+    speed, acceleration = float(speed), float(acceleration)
+    duration = motion_time(total, speed, acceleration)
+    if elapsed <= 0 or duration <= 0:
+        ret = 0.
+    elif elapsed >= duration:
+        ret = total
+    elif acceleration <= 0:
+        ret = speed * elapsed
+    else:
+        ramp = min(speed / acceleration, duration / 2)
+        if elapsed < ramp:
+            ret = acceleration * elapsed ** 2 / 2
+        elif elapsed <= duration - ramp:
+            ret = acceleration * ramp ** 2 / 2 + acceleration * ramp * (elapsed - ramp)
+        else:
+            ret = total - acceleration * (duration - elapsed) ** 2 / 2
+    return math.copysign(ret, distance)
+
+
 class Board(object):
 
     """Board class. For accessing to the scanner board
@@ -50,6 +88,11 @@ class Board(object):
 
         M50 Tn  : read ldr sensor
 
+        !       : feed hold
+        ~       : cycle resume
+
+    Commands are sent through an acknowledged channel that keeps up to
+    buffer_size commands in flight.
     """
 
     def __init__(self, parent=None, serial_name='/dev/ttyUSB0', baud_rate=115200):
@@ -57,14 +100,23 @@ class Board(object):
         self.serial_name = serial_name
         self.baud_rate = baud_rate
         self.unplug_callback = None
+        self.buffer_size = 4
+        self.command_timeout = 2.0
 
         self._serial_port = None
+        self._channel = None
+        self._executor = CommandExecutor()
         self._is_connected = False
         self._motor_enabled = False
         self._motor_position = 0
         self._motor_speed = 0
         self._motor_acceleration = 0
         self._motor_direction = 1
+        self._motor_enable_time = 1
+        self._motion_end = 0
+        self._motion = (0, 0, 0, 0)  # Start time, step, speed, acceleration
+        self._enable_end = 0
+        self._hold = None
         self._laser_number = 2
         self._laser_enabled = self._laser_number * [False]
         self._tries = 0  # Check if command fails
@@ -73,6 +125,7 @@ class Board(object):
         """Open serial port and perform handshake"""
         logger.info("Connecting board {0} {1}".format(self.serial_name, self.baud_rate))
         self._is_connected = False
+        self._executor.start()
         try:
             self._serial_port = serial.Serial(self.serial_name, self.baud_rate, timeout=2)
             if self._serial_port.isOpen():
@@ -83,6 +136,8 @@ class Board(object):
                 elif "Horus 0.2 ['$' for help]" in version:
                     self.motor_speed(1)
                     self._serial_port.timeout = 0.05
+                    self._channel = GcodeChannel(self._serial_port, self.buffer_size)
+                    self._channel.start()
                     self._is_connected = True
                     # Set current position as origin
                     self.motor_reset_origin()
@@ -100,11 +155,14 @@ class Board(object):
         """Close serial port"""
         if self._is_connected:
             logger.info("Disconnecting board {0}".format(self.serial_name))
+            self._executor.stop()
             try:
                 if self._serial_port is not None:
                     self.lasers_off()
                     self.motor_disable()
                     self._is_connected = False
+                    self._channel.stop()
+                    self._channel = None
                     self._serial_port.close()
                     del self._serial_port
             except serial.SerialException:
@@ -139,9 +197,9 @@ class Board(object):
                 # Save current speed value
                 speed = self._motor_speed
                 self.motor_speed(1)
-                # Enable stepper motor
+                # Enable stepper motor. Moves wait until it is ready
                 self._send_command("M17")
-                time.sleep(1)
+                self._enable_end = self._clock() + self._motor_enable_time
                 # Restore speed value
                 self.motor_speed(speed)
 
@@ -159,7 +217,62 @@ class Board(object):
     def motor_move(self, step=0, nonblocking=False, callback=None):
         if self._is_connected:
             self._motor_position += step * self._motor_direction
-            self.send_command("G1X{0}".format(self._motor_position), nonblocking, callback)
+            req = "G1X{0}".format(self._motor_position)
+            if nonblocking:
+                return self._executor.submit(CommandFuture(req, callback),
+                                             lambda: self._move(req, step))
+            else:
+                ret = self._move(req, step)
+                if callback is not None:
+                    callback(ret)
+                return ret
+
+    def motor_wait(self):
+        """Block until the motion of the platform is complete"""
+        self._sleep_until(self._motion_end)
+
+    def motor_hold(self):
+        """Pause the current motion"""
+        if self._is_connected and self._hold is None:
+            self._send_command("!")
+            self._hold = self._clock()
+
+    def motor_resume(self):
+        """Continue the motion paused by motor_hold"""
+        if self._is_connected and self._hold is not None:
+            self._send_command("~")
+            if self._hold < self._motion_end:
+                # The rest of the motion is delayed by the hold
+                delay = self._clock() - self._hold
+                start, step, speed, acceleration = self._motion
+                self._motion = (start + delay, step, speed, acceleration)
+                self._motion_end += delay
+            self._hold = None
+
+    def is_moving(self):
+        return self._clock() < self._motion_end
+
+    def motion_offset(self, timestamp):
+        """Angle (º) covered by the last move at the given time"""
+        start, step, speed, acceleration = self._motion
+        return motion_distance(timestamp - start, step, speed, acceleration)
+
+    def _move(self, req, step):
+        self._sleep_until(self._enable_end)
+        # The motion starts when the previous one finishes
+        start = max(self._clock(), self._motion_end)
+        self._motion = (start, step, self._motor_speed, self._motor_acceleration)
+        self._motion_end = start + motion_time(step, self._motor_speed, self._motor_acceleration)
+        return self._send_command(req, timeout=self._motion_end - self._clock())
+
+    def _clock(self):
+        """Time base of the motion timestamps"""
+        return time.time()
+
+    def _sleep_until(self, end):
+        remaining = end - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
 
     def laser_on(self, index):
         if self._is_connected:
@@ -189,39 +302,52 @@ class Board(object):
             return 0
 
     def send_command(self, req, nonblocking=False, callback=None, read_lines=False):
+        """Sends the request. If nonblocking, it is queued in the board executor
+           and its future is returned"""
         if nonblocking:
-            threading.Thread(target=self._send_command,
-                             args=(req, callback, read_lines)).start()
+            return self._executor.submit(CommandFuture(req, callback),
+                                         lambda: self._send_command(req, read_lines=read_lines))
         else:
-            self._send_command(req, callback, read_lines)
-
-    def _send_command(self, req, callback=None, read_lines=False):
-        """Sends the request and returns the response"""
-        ret = ''
-        if self._is_connected and req != '':
-            if self._serial_port is not None and self._serial_port.isOpen():
-                try:
-                    self._serial_port.flushInput()
-                    self._serial_port.flushOutput()
-                    self._serial_port.write(req + "\r\n")
-                    while req != '~' and req != '!' and ret == '':
-                        ret = self.read(read_lines)
-                        time.sleep(0.01)
-                    self._success()
-                except:
-                    if hasattr(self, '_serial_port'):
-                        if callback is not None:
-                            callback(ret)
-                        self._fail()
-        if callback is not None:
-            callback(ret)
+            return self._send_command(req, callback, read_lines)
+
+    def queue_depth(self):
+        """Number of commands queued or waiting for a response"""
+        depth = self._executor.depth()
+        if self._channel is not None:
+            depth += self._channel.pending()
+        return depth
+
+    def _send_command(self, req, callback=None, read_lines=False, timeout=0):
+        """Sends the request and returns the response. The response is
+           expected in command_timeout plus the given timeout (s)"""
+        future = self.queue_command(req, callback)
+        ret = future.wait(self.command_timeout + max(timeout, 0))
+        if not future.done():
+            logger.warning("Board command {0} timed out".format(req))
+            channel = self._channel
+            if channel is not None:
+                # The channel fails: a late response would complete the next command
+                channel.discard(future)
+                self._unplug()
+            else:
+                future.cancel()
+            ret = future.response
+        if not future.cancelled:
+            self._success()
+        elif self._is_connected:
+            self._fail()
         return ret
 
-    def read(self, read_lines=False):
-        if read_lines:
-            return ''.join(self._serial_port.readlines())
-        else:
-            return ''.join(self._serial_port.readline())
+    def queue_command(self, req, callback=None):
+        """Sends the request without waiting and returns its future"""
+        future = None
+        if self._is_connected and req != '':
+            if self._channel is not None:
+                future = self._channel.send(req, callback)
+        if future is None:
+            future = CommandFuture(req, callback)
+            future.cancel()
+        return future
 
     def _success(self):
         self._tries = 0
@@ -232,11 +358,14 @@ class Board(object):
             self._tries += 1
             if self._tries >= 3:
                 self._tries = 0
-                if self.unplug_callback is not None and \
-                   self.parent is not None and \
-                   not self.parent.unplugged:
-                    self.parent.unplugged = True
-                    self.unplug_callback()
+                self._unplug()
+
+    def _unplug(self):
+        if self.unplug_callback is not None and \
+           self.parent is not None and \
+           not self.parent.unplugged:
+            self.parent.unplugged = True
+            self.unplug_callback()
 
     def _reset(self):
         self._serial_port.flushInput()
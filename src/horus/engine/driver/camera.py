@@ -10,6 +10,8 @@ import math
 import time
 import glob
 import platform
+import threading
+import collections
 
 import logging
 logger = logging.getLogger(__name__)
@@ -59,8 +61,16 @@ class Camera(object):
         self.parent = parent
         self.camera_id = camera_id
         self.unplug_callback = None
+        self.record_session = None
+        self.use_grabber = False
+        self.last_timestamp = 0  # Exposure start of the last image
 
         self._capture = None
+        self._lock = threading.Lock()
+        self._grabbing = False
+        self._grab_thread = None
+        self._frames = collections.deque(maxlen=4)
+        self._frames_condition = threading.Condition()
         self._is_connected = False
         self._reading = False
         self._updating = False
@@ -121,6 +131,8 @@ class Camera(object):
             self._check_video()
             self._check_camera()
             self._check_driver()
+            if self.use_grabber:
+                self.start_grabber()
             logger.info(" Done")
         else:
             raise CameraNotConnected()
@@ -129,6 +141,7 @@ class Camera(object):
         tries = 0
         if self._is_connected:
             logger.info("Disconnecting camera {0}".format(self.camera_id))
+            self.stop_grabber()
             if self._capture is not None:
                 if self._capture.isOpened():
                     self._is_connected = False
@@ -141,6 +154,69 @@ class Camera(object):
     def set_unplug_callback(self, value):
         self.unplug_callback = value
 
+    def set_use_grabber(self, value):
+        self.use_grabber = value
+        if self._is_connected:
+            if value:
+                self.start_grabber()
+            else:
+                self.stop_grabber()
+
+    def is_grabbing(self):
+        return self._grabbing
+
+    def start_grabber(self):
+        """Start the thread that keeps grabbing frames in background"""
+        if not self._grabbing:
+            with self._frames_condition:
+                self._frames.clear()
+            self._grabbing = True
+            self._grab_thread = threading.Thread(target=self._grab_loop)
+            self._grab_thread.daemon = True
+            self._grab_thread.start()
+
+    def stop_grabber(self):
+        if self._grabbing:
+            self._grabbing = False
+            self._grab_thread.join(1)
+            self._grab_thread = None
+            with self._frames_condition:
+                self._frames.clear()
+                self._frames_condition.notify_all()
+
+    def _grab_loop(self):
+        while self._grabbing:
+            with self._lock:
+                ret, image = self._capture.read()
+            if ret:
+                # The exposure started about one frame period before the frame is read
+                stamp = time.time() - self._frame_period()
+                with self._frames_condition:
+                    self._frames.append((stamp, image))
+                    self._frames_condition.notify_all()
+            else:
+                time.sleep(self._frame_period())
+
+    def _grabbed_image(self, after, timeout):
+        """Return the first grabbed frame whose exposure started after the given time"""
+        deadline = time.time() + timeout
+        with self._frames_condition:
+            while self._grabbing:
+                for stamp, image in self._frames:
+                    if stamp >= after:
+                        return True, image, stamp
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._frames_condition.wait(remaining)
+        return False, None, None
+
+    def _frame_period(self):
+        if self._frame_rate > 0:
+            return 1.0 / self._frame_rate
+        else:
+            return 1.0 / 30
+
     def _check_video(self):
         """Check correct video"""
         frame = self.capture_image(flush=1)
@@ -181,41 +257,56 @@ class Camera(object):
             if mean > 200:
                 raise WrongDriver()
 
-    def capture_image(self, flush=0, auto=False):
-        """Capture image from camera"""
+    def capture_image(self, flush=0, auto=False, after=None):
+        """Capture image from camera
+
+        If the grabber is running, the first frame whose exposure started
+        flush frame periods after the given time (default: now) is returned.
+        """
         if self._is_connected:
             if self._updating:
                 return self._last_image
+            elif self._grabbing:
+                if after is None:
+                    after = time.time()
+                after += flush * self._frame_period()
+                ret, image, stamp = self._grabbed_image(
+                    after, (flush + self._number_frames_fail) * self._frame_period() + 1)
             else:
                 self._reading = True
-                if auto:
-                    b, e = 0, 0
-                    while e - b < (0.030):
-                        b = time.time()
-                        self._capture.grab()
-                        e = time.time()
-                else:
-                    if flush > 0:
-                        for i in xrange(flush):
-                            self._capture.read()
-                            # Note: Windows needs read() to perform
-                            #       the flush instead of grab()
-                ret, image = self._capture.read()
+                with self._lock:
+                    if auto:
+                        b, e = 0, 0
+                        while e - b < (0.030):
+                            b = time.time()
+                            self._capture.grab()
+                            e = time.time()
+                    else:
+                        if flush > 0:
+                            for i in xrange(flush):
+                                self._capture.read()
+                                # Note: Windows needs read() to perform
+                                #       the flush instead of grab()
+                    ret, image = self._capture.read()
+                stamp = time.time() - self._frame_period()
                 self._reading = False
-                if ret:
-                    if self._rotate:
-                        image = cv2.transpose(image)
-                    if self._hflip:
-                        image = cv2.flip(image, 1)
-                    if self._vflip:
-                        image = cv2.flip(image, 0)
-                    self._success()
-                    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                    self._last_image = image
-                    return image
-                else:
-                    self._fail()
-                    return None
+            if ret:
+                if self._rotate:
+                    image = cv2.transpose(image)
+                if self._hflip:
+                    image = cv2.flip(image, 1)
+                if self._vflip:
+                    image = cv2.flip(image, 0)
+                self._success()
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                self._last_image = image
+                self.last_timestamp = stamp
+                if self.record_session is not None and self.parent is not None:
+                    self.record_session.record(image, self.parent.board, self)
+                return image
+            else:
+                self._fail()
+                return None
         else:
             return None
 
@@ -242,7 +333,7 @@ class Camera(object):
                     ctl.set_val(self._line(value, 0, self._max_brightness, ctl.min, ctl.max))
                 else:
                     value = int(value) / self._max_brightness
-                    ret = self._capture.set(cv2.cv.CV_CAP_PROP_BRIGHTNESS, value)
+                    ret = self._set_property(cv2.cv.CV_CAP_PROP_BRIGHTNESS, value)
                     if system == 'Linux' and ret:
                         raise InputOutputError()
                 self._updating = False
@@ -257,7 +348,7 @@ class Camera(object):
                     ctl.set_val(self._line(value, 0, self._max_contrast, ctl.min, ctl.max))
                 else:
                     value = int(value) / self._max_contrast
-                    ret = self._capture.set(cv2.cv.CV_CAP_PROP_CONTRAST, value)
+                    ret = self._set_property(cv2.cv.CV_CAP_PROP_CONTRAST, value)
                     if system == 'Linux' and ret:
                         raise InputOutputError()
                 self._updating = False
@@ -272,7 +363,7 @@ class Camera(object):
                     ctl.set_val(self._line(value, 0, self._max_saturation, ctl.min, ctl.max))
                 else:
                     value = int(value) / self._max_saturation
-                    ret = self._capture.set(cv2.cv.CV_CAP_PROP_SATURATION, value)
+                    ret = self._set_property(cv2.cv.CV_CAP_PROP_SATURATION, value)
                     if system == 'Linux' and ret:
                         raise InputOutputError()
                 self._updating = False
@@ -291,10 +382,10 @@ class Camera(object):
                     ctl.set_val(value)
                 elif system == 'Windows':
                     value = int(round(-math.log(value) / math.log(2)))
-                    self._capture.set(cv2.cv.CV_CAP_PROP_EXPOSURE, value)
+                    self._set_property(cv2.cv.CV_CAP_PROP_EXPOSURE, value)
                 else:
                     value = int(value) / self._max_exposure
-                    ret = self._capture.set(cv2.cv.CV_CAP_PROP_EXPOSURE, value)
+                    ret = self._set_property(cv2.cv.CV_CAP_PROP_EXPOSURE, value)
                     if system == 'Linux' and ret:
                         raise InputOutputError()
                 self._updating = False
@@ -313,7 +404,7 @@ class Camera(object):
             if self._frame_rate != value:
                 self._frame_rate = value
                 self._updating = True
-                self._capture.set(cv2.cv.CV_CAP_PROP_FPS, value)
+                self._set_property(cv2.cv.CV_CAP_PROP_FPS, value)
                 self._updating = False
 
     def set_resolution(self, width, height):
@@ -326,14 +417,22 @@ class Camera(object):
                 self._updating = False
 
     def _set_width(self, value):
-        self._capture.set(cv2.cv.CV_CAP_PROP_FRAME_WIDTH, value)
+        self._set_property(cv2.cv.CV_CAP_PROP_FRAME_WIDTH, value)
 
     def _set_height(self, value):
-        self._capture.set(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT, value)
+        self._set_property(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT, value)
+
+    def _set_property(self, prop, value):
+        with self._lock:
+            return self._capture.set(prop, value)
+
+    def _get_property(self, prop):
+        with self._lock:
+            return self._capture.get(prop)
 
     def _update_resolution(self):
-        self._width = int(self._capture.get(cv2.cv.CV_CAP_PROP_FRAME_WIDTH))
-        self._height = int(self._capture.get(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT))
+        self._width = int(self._get_property(cv2.cv.CV_CAP_PROP_FRAME_WIDTH))
+        self._height = int(self._get_property(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT))
 
     def get_brightness(self):
         if self._is_connected:
@@ -341,7 +440,7 @@ class Camera(object):
                 ctl = self.controls['UVCC_REQ_BRIGHTNESS_ABS']
                 value = ctl.get_val()
             else:
-                value = self._capture.get(cv2.cv.CV_CAP_PROP_BRIGHTNESS)
+                value = self._get_property(cv2.cv.CV_CAP_PROP_BRIGHTNESS)
                 value *= self._max_brightness
             return value
 
@@ -352,10 +451,10 @@ class Camera(object):
                 value = ctl.get_val()
                 value /= self._rel_exposure
             elif system == 'Windows':
-                value = self._capture.get(cv2.cv.CV_CAP_PROP_EXPOSURE)
+                value = self._get_property(cv2.cv.CV_CAP_PROP_EXPOSURE)
                 value = 2 ** -value
             else:
-                value = self._capture.get(cv2.cv.CV_CAP_PROP_EXPOSURE)
+                value = self._get_property(cv2.cv.CV_CAP_PROP_EXPOSURE)
                 value *= self._max_exposure
             return value
 
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+import Queue
+import threading
+import collections
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class CommandTimeout(Exception):
+
+    def __init__(self, req):
+        Exception.__init__(self, "No response to {0}".format(req))
+
+
+class CommandFuture(object):
+
+    """Pending response of a command sent to the board"""
+
+    def __init__(self, req, callback=None):
+        self.req = req
+        self.response = ''
+        self.error = None
+        self.cancelled = False
+        self._callback = callback
+        self._done = threading.Event()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the response is received and return it"""
+        self._done.wait(timeout)
+        return self.response
+
+    def cancel(self):
+        if not self.done():
+            self.cancelled = True
+            self._finish('')
+
+    def _finish(self, response, error=None):
+        self.response = response
+        self.error = error
+        self._done.set()
+        if self._callback is not None:
+            self._callback(response)
+
+
+class GcodeChannel(object):
+
+    """Acknowledged G-code channel over a serial port
+
+    Commands are written in order as soon as there is room in the firmware
+    buffer. A reader thread matches each "ok" or "error" response with the
+    oldest command in flight. Real-time commands (~, !) have no response.
+    """
+
+    REALTIME = ('~', '!')
+
+    def __init__(self, serial_port, buffer_size=4):
+        self.serial_port = serial_port
+        self.buffer_size = buffer_size
+
+        self._lock = threading.RLock()
+        self._slots = threading.Semaphore(buffer_size)
+        self._in_flight = collections.deque()
+        self._lines = []
+        self._partial = ''
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._read_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the reader thread and cancel the commands in flight"""
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(1)
+        self._thread = None
+        self._cancel_all()
+
+    def send(self, req, callback=None):
+        """Write the command and return its future. Blocks while the buffer is full"""
+        future = CommandFuture(req, callback)
+        if not self._running:
+            future.cancel()
+        elif req in self.REALTIME:
+            with self._lock:
+                self._write(future)
+            if future.error is None:
+                future._finish('')
+        else:
+            self._slots.acquire()
+            with self._lock:
+                if self._running:
+                    self._in_flight.append(future)
+                    self._write(future)
+                else:
+                    self._slots.release()
+                    future.cancel()
+        return future
+
+    def discard(self, future):
+        """Cancel a command whose response was lost. The channel fails, as a
+           late response would complete the next command"""
+        self._error(CommandTimeout(future.req))
+        future.cancel()
+
+    def pending(self):
+        """Number of commands waiting for a response"""
+        return len(self._in_flight)
+
+    def _write(self, future):
+        try:
+            self.serial_port.write(future.req + "\r\n")
+        except Exception as e:
+            self._error(e)
+
+    def _read_loop(self):
+        while self._running:
+            try:
+                line = self.serial_port.readline()
+            except Exception as e:
+                self._error(e)
+                break
+            if line:
+                # The read timeout can split a line
+                self._partial += line
+                if not self._partial.endswith('\n'):
+                    continue
+                line, self._partial = self._partial, ''
+                self._lines.append(line)
+                if line.startswith('ok') or line.startswith('error'):
+                    self._complete(''.join(self._lines))
+                    self._lines = []
+
+    def _complete(self, response):
+        with self._lock:
+            if len(self._in_flight) == 0:
+                logger.debug("Unexpected response: {0}".format(response.strip()))
+                return
+            future = self._in_flight.popleft()
+            self._slots.release()
+        future._finish(response)
+
+    def _error(self, exception):
+        logger.error("Serial channel error: {0}".format(exception))
+        self._running = False
+        self._cancel_all(exception)
+
+    def _cancel_all(self, exception=None):
+        with self._lock:
+            futures = list(self._in_flight)
+            self._in_flight.clear()
+            for _ in futures:
+                self._slots.release()
+        for future in futures:
+            future.cancelled = True
+            future._finish('', exception)
+
+
+class CommandExecutor(object):
+
+    """Single worker thread that runs the queued board commands in order"""
+
+    def __init__(self):
+        self._queue = Queue.Queue()
+        self._thread = None
+        self.start()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Cancel the queued commands and end the worker thread"""
+        if self._thread is not None:
+            self.cancel()
+            self._queue.put((None, None))
+            if self._thread is not threading.current_thread():
+                self._thread.join(1)
+            self._thread = None
+
+    def submit(self, future, function):
+        """Queue function to complete the future with its result"""
+        self._queue.put((future, function))
+        return future
+
+    def depth(self):
+        """Number of commands waiting to run"""
+        return self._queue.qsize()
+
+    def cancel(self):
+        """Cancel the commands that have not started"""
+        while True:
+            try:
+                future, _ = self._queue.get_nowait()
+            except Queue.Empty:
+                break
+            future.cancel()
+
+    def _run(self):
+        while True:
+            future, function = self._queue.get()
+            if future is None:
+                break
+            if future.cancelled:
+                continue
+            try:
+                future._finish(function())
+            except Exception as e:
+                logger.error("Board command {0} failed: {1}".format(future.req, e))
+                future._finish('', e)
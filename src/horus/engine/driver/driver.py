@@ -10,6 +10,7 @@ import threading
 from horus import Singleton
 from horus.engine.driver.board import Board
 from horus.engine.driver.camera import Camera
+from horus.engine.driver.replay import ReplaySession, ReplayBoard, ReplayCamera
 
 
 @Singleton
@@ -20,6 +21,7 @@ class Driver(object):
     def __init__(self):
         self.board = Board(self)
         self.camera = Camera(self)
+        self._hardware = (self.board, self.camera)
         self.is_connected = False
         self.unplugged = False
 
@@ -57,6 +59,33 @@ class Driver(object):
         self.is_connected = False
         self.camera.disconnect()
         self.board.disconnect()
+        if self.camera.record_session is not None:
+            self.camera.record_session.save()
+
+    def set_replay_session(self, path):
+        """Serve camera and board from a recorded session. None for hardware:
+           the hardware board and camera are restored with their settings"""
+        if self.is_connected:
+            self.disconnect()
+        if self.board is not self._hardware[0]:
+            # Release the worker thread of the replay board
+            self.board.disconnect()
+        if path is None:
+            self.board, self.camera = self._hardware
+        else:
+            session = ReplaySession(path)
+            session.load()
+            self.board = ReplayBoard(self, session)
+            self.camera = ReplayCamera(self, session)
+
+    def set_record_session(self, path):
+        """Record captured frames into a session. None to stop recording"""
+        if self.camera.record_session is not None:
+            self.camera.record_session.save()
+        if path is None:
+            self.camera.record_session = None
+        else:
+            self.camera.record_session = ReplaySession(path)
 
     def set_callbacks(self, before, after):
         self._before_callback = before
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+import os
+import re
+import time
+import select
+import threading
+
+from horus.engine.driver.board import motion_time
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class FirmwareEmulator(object):
+
+    """Horus 0.2 firmware emulator on a pseudo-terminal (only POSIX)
+
+    Board can connect to serial_name as to the scanner board:
+
+        emulator = FirmwareEmulator()
+        emulator.start()
+        board = Board(serial_name=emulator.serial_name)
+
+    Supported commands: Ctrl-x, G1 Fnnn, G1 Xnnn, G50, M17, M18, M70 Tn,
+    M71 Tn, M50 Tn, $120=nnn, the '?' status report and the '!' feed hold
+    and '~' cycle resume real-time commands.
+
+        latency          : time to answer each command (s)
+        ack_after_motion : answer G1 X when the motion has finished
+    """
+
+    banner = "Horus 0.2 ['$' for help]"
+
+    def __init__(self, latency=0.0, ack_after_motion=False):
+        self.latency = latency
+        self.ack_after_motion = ack_after_motion
+        self.serial_name = None
+
+        self.position = 0.0
+        self.speed = 1.0
+        self.acceleration = 200.0
+        self.motor_enabled = False
+        self.lasers = [False, False]
+        self.ldr = 512
+        self.commands = []
+
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._running = False
+        self._motion_end = 0.0
+        self._hold = None
+
+    def start(self):
+        import tty
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.serial_name = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Close the pseudo-terminal, as if the board was unplugged"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(1)
+            self._thread = None
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+
+    def is_moving(self):
+        return self._hold is None and time.time() < self._motion_end
+
+    def _realtime(self, command):
+        now = time.time()
+        if command == '!' and self._hold is None:
+            self._hold = now
+        elif command == '~' and self._hold is not None:
+            if self._hold < self._motion_end:
+                self._motion_end += now - self._hold
+            self._hold = None
+
+    def _run(self):
+        data = ''
+        while self._running:
+            try:
+                if not select.select([self._master], [], [], 0.1)[0]:
+                    continue
+                chunk = os.read(self._master, 1024)
+            except (OSError, select.error):
+                break
+            if not chunk:
+                break
+            data += chunk
+            while '?' in data:
+                data = data.replace('?', '', 1)
+                self._write(self._status())
+            for command in '!~':
+                while command in data:
+                    data = data.replace(command, '', 1)
+                    self._realtime(command)
+            lines = re.split('[\r\n]', data)
+            data = lines.pop()
+            for line in lines:
+                line = line.strip()
+                if line:
+                    self._process(line)
+
+    def _process(self, line):
+        self.commands.append(line)
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if '\x18' in line:
+            self.motor_enabled = False
+            self.lasers = [False, False]
+            self._write("\r\n" + self.banner + "\r\n")
+            return
+        response = self._execute(line.upper().replace(' ', ''))
+        if response is None:
+            self._write("error: Invalid statement\r\n")
+        else:
+            self._write(response + "ok\r\n")
+
+    def _execute(self, command):
+        match = re.match(r'^G1(F([-\d.]+))?(X([-\d.]+))?$', command)
+        if match and (match.group(2) or match.group(4)):
+            if match.group(2):
+                self.speed = float(match.group(2))
+            if match.group(4):
+                target = float(match.group(4))
+                begin = max(time.time(), self._motion_end)
+                self._motion_end = begin + motion_time(
+                    target - self.position, self.speed, self.acceleration)
+                self.position = target
+                if self.ack_after_motion:
+                    time.sleep(max(self._motion_end - time.time(), 0))
+            return ''
+        elif command == 'G50':
+            self.position = 0.0
+            return ''
+        elif command in ('M17', 'M18'):
+            self.motor_enabled = command == 'M17'
+            return ''
+        match = re.match(r'^M(70|71|50)T(\d)$', command)
+        if match:
+            index = int(match.group(2)) - 1
+            if match.group(1) == '50':
+                return "{0}\r\n".format(self.ldr)
+            elif 0 <= index < len(self.lasers):
+                self.lasers[index] = match.group(1) == '71'
+                return ''
+        match = re.match(r'^\$120=([\d.]+)$', command)
+        if match:
+            self.acceleration = float(match.group(1))
+            return ''
+
+    def _status(self):
+        if self._hold is not None:
+            state = 'Hold'
+        else:
+            state = 'Run' if self.is_moving() else 'Idle'
+        return "<{0},MPos:{1:.3f},0.000,0.000>\r\n".format(state, self.position)
+
+    def _write(self, data):
+        try:
+            os.write(self._master, data)
+        except OSError:
+            self._running = False
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+import os
+import cv2
+import json
+
+from horus.engine.driver.board import Board
+from horus.engine.driver.camera import Camera
+from horus.engine.driver.channel import CommandFuture
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class InvalidSession(Exception):
+
+    def __init__(self):
+        Exception.__init__(self, "Invalid Session")
+
+
+class ReplaySession(object):
+
+    """Replay session class. Frames recorded from the scanner on disk
+
+    Each frame is tagged with the state of the scanner when it was captured:
+
+        theta    : motor position (º)
+        lasers   : lasers on/off state
+        settings : camera brightness, contrast, saturation and exposure
+
+    The session is stored in a directory with an index file (session.json)
+    and one PNG image per frame.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.width = 0
+        self.height = 0
+        self._frames = {}
+
+    def load(self):
+        filename = os.path.join(self.path, 'session.json')
+        if not os.path.isfile(filename):
+            raise InvalidSession()
+        with open(filename, 'r') as f:
+            data = json.loads(f.read())
+        self.width, self.height = data['resolution']
+        self._frames = {}
+        for frame in data['frames']:
+            key = self._key(frame['theta'], frame['lasers'], frame['settings'])
+            self._frames[key] = frame['file']
+        logger.info("Loaded session {0}: {1} frames".format(self.path, len(self._frames)))
+
+    def save(self):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        frames = []
+        for (theta, lasers, settings), filename in sorted(self._frames.items()):
+            frames.append({'theta': theta,
+                           'lasers': list(lasers),
+                           'settings': list(settings),
+                           'file': filename})
+        data = {'resolution': [self.width, self.height], 'frames': frames}
+        with open(os.path.join(self.path, 'session.json'), 'w') as f:
+            f.write(json.dumps(data, sort_keys=True, indent=4))
+
+    def record(self, image, board, camera):
+        """Store the image tagged with the current board and camera state"""
+        if image is not None:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            self.height, self.width = image.shape[:2]
+            key = self._key(board._motor_position, board._laser_enabled,
+                            camera_settings(camera))
+            filename = self._frames.get(key, 'frame_{0:06d}.png'.format(len(self._frames)))
+            cv2.imwrite(os.path.join(self.path, filename),
+                        cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+            self._frames[key] = filename
+
+    def frame(self, theta, lasers, settings):
+        """Return the recorded image nearest to theta with the same lasers state.
+           Frames with the same camera settings are preferred"""
+        lasers = tuple(bool(l) for l in lasers)
+        settings = tuple(float(s) for s in settings)
+        candidates = [key for key in self._frames.keys() if key[1] == lasers]
+        matches = [key for key in candidates if key[2] == settings]
+        if len(matches) > 0:
+            candidates = matches
+        if len(candidates) > 0:
+            key = min(candidates, key=lambda k: self._angle_distance(k[0], theta))
+            image = cv2.imread(os.path.join(self.path, self._frames[key]))
+            if image is not None:
+                return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    def _key(self, theta, lasers, settings):
+        return (round(float(theta), 4),
+                tuple(bool(l) for l in lasers),
+                tuple(float(s) for s in settings))
+
+    def _angle_distance(self, a, b):
+        d = abs(a - b) % 360.0
+        return min(d, 360.0 - d)
+
+    def __len__(self):
+        return len(self._frames)
+
+
+def camera_settings(camera):
+    return (camera._brightness, camera._contrast, camera._saturation, camera._exposure)
+
+
+class ReplayBoard(Board):
+
+    """Replay board class. Emulates the scanner board state without serial port"""
+
+    def __init__(self, parent=None, session=None):
+        Board.__init__(self, parent)
+        self.session = session
+        self._motor_enable_time = 0
+        self._time = 0.0
+        if session is not None:
+            self.serial_name = session.path
+
+    def connect(self):
+        logger.info("Connecting replay board {0}".format(self.serial_name))
+        self._executor.start()
+        self._is_connected = True
+        self.motor_speed(1)
+        self.motor_reset_origin()
+        logger.info(" Done")
+
+    def disconnect(self):
+        self._executor.stop()
+        if self._is_connected:
+            logger.info("Disconnecting replay board {0}".format(self.serial_name))
+            self.lasers_off()
+            self.motor_disable()
+            self._is_connected = False
+            logger.info(" Done")
+
+    def motor_move(self, step=0, nonblocking=False, callback=None):
+        ret = Board.motor_move(self, step, nonblocking, callback)
+        if not nonblocking:
+            # Blocking moves are complete when they return
+            self.motor_wait()
+        return ret
+
+    def advance(self, seconds):
+        """Advance the virtual clock"""
+        self._time += seconds
+
+    def _clock(self):
+        # Motion runs on a virtual clock, so the replay does not wait
+        return self._time
+
+    def _sleep_until(self, end):
+        self._time = max(self._time, end)
+
+    def queue_command(self, req, callback=None):
+        future = CommandFuture(req, callback)
+        if self._is_connected and req != '':
+            future._finish('ok')
+        else:
+            future.cancel()
+        return future
+
+    def get_serial_list(self):
+        return [self.serial_name]
+
+
+class ReplayCamera(Camera):
+
+    """Replay camera class. Serves the recorded frames that match the board state"""
+
+    def __init__(self, parent=None, session=None):
+        Camera.__init__(self, parent)
+        self.session = session
+
+    def connect(self):
+        logger.info("Connecting replay camera {0}".format(self.session.path))
+        self._is_connected = False
+        self.initialize()
+        if len(self.session) == 0:
+            raise InvalidSession()
+        self._is_connected = True
+        logger.info(" Done")
+
+    def disconnect(self):
+        if self._is_connected:
+            logger.info("Disconnecting replay camera {0}".format(self.session.path))
+            self._is_connected = False
+            logger.info(" Done")
+
+    def capture_image(self, flush=0, auto=False, after=None):
+        if self._is_connected and self.parent is not None:
+            board = self.parent.board
+            # Each frame takes a frame period of the board virtual clock
+            board.advance((flush + 1) * self._frame_period())
+            timestamp = board._clock()
+            # Position of the platform during the current move
+            step = board._motion[1]
+            theta = board._motor_position - \
+                (step - board.motion_offset(timestamp)) * board._motor_direction
+            image = self.session.frame(theta, board._laser_enabled, camera_settings(self))
+            if image is not None:
+                self._success()
+                self._last_image = image
+                self.last_timestamp = timestamp
+                return image
+            else:
+                self._fail()
+
+    def set_brightness(self, value):
+        self._brightness = value
+
+    def set_contrast(self, value):
+        self._contrast = value
+
+    def set_saturation(self, value):
+        self._saturation = value
+
+    def set_exposure(self, value, force=False):
+        self._exposure = value
+
+    def set_frame_rate(self, value):
+        self._frame_rate = value
+
+    def set_resolution(self, width, height):
+        pass
+
+    def get_brightness(self):
+        return self._brightness
+
+    def get_exposure(self):
+        return self._exposure
+
+    def get_resolution(self):
+        return int(self.session.width), int(self.session.height)
+
+    def get_video_list(self):
+        return [self.session.path]
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+import Queue
+import ctypes
+import numpy as np
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+
+from horus.engine.scan.scan_capture import ScanCapture, decode_texture
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+from horus.engine.algorithms.point_cloud_generation import PointCloudGeneration
+from horus.engine.calibration.calibration_data import CalibrationData
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+SEGMENTATION_FIELDS = ('red_channel', 'threshold_enable', 'threshold_value', 'blur_enable',
+                       'blur_value', 'window_enable', 'window_value', 'refinement_method',
+                       'fused_enable')
+
+
+class WorkersError(Exception):
+
+    def __init__(self):
+        Exception.__init__(self, "Capture workers stopped")
+
+
+def compute_capture(capture, laser_segmentation, point_cloud_generation,
+                    bicolor=False, undistort=False):
+    """Compute segmented images, 2D points and textured point clouds of a capture.
+       With undistort, the 2D points of raw frames are corrected before
+       the triangulation. Texture is sampled at the raw points, or at the
+       reprojected points if it was captured at other theta.
+       Compact captures are restored to the full image coordinates"""
+    images = [None, None]
+    points = [None, None]
+    point_clouds = [None, None]
+    u0, v0 = capture.offset
+    capture_texture = decode_texture(capture.texture)
+
+    for i in xrange(2):
+        if capture.lasers[i] is not None:
+            # Compute 2D points from images
+            points_2d, image = laser_segmentation.compute_2d_points(capture.lasers[i])
+            if u0 != 0 or v0 != 0:
+                points_2d = (points_2d[0] + u0, points_2d[1] + v0)
+            calibration_data = laser_segmentation.calibration_data
+            if image.shape != (calibration_data.height, calibration_data.width):
+                image = _uncrop(image, u0, v0, calibration_data)
+            images[i] = image
+            points[i] = points_2d
+            # Compute point cloud from 2D points
+            if undistort:
+                point_cloud = point_cloud_generation.compute_point_cloud(
+                    capture.theta, point_cloud_generation.undistort_points(points_2d), i)
+            else:
+                point_cloud = point_cloud_generation.compute_point_cloud(
+                    capture.theta, points_2d, i)
+            # Compute point cloud texture
+            u, v = points_2d
+
+            if bicolor:
+                if i == 0:
+                    r, g, b = 255, 0, 0
+                else:
+                    r, g, b = 0, 255, 0
+                texture = np.zeros((3, len(v)), np.uint8)
+                texture[0, :] = r
+                texture[1, :] = g
+                texture[2, :] = b
+            elif capture.texture_theta is not None and point_cloud is not None:
+                u, v = point_cloud_generation.project_point_cloud(
+                    point_cloud, capture.texture_theta, undistort)
+                texture = _sample_texture(capture_texture, u - u0, v - v0)
+            else:
+                texture = capture_texture[v - v0, np.around(u).astype(int) - u0].T
+
+            point_clouds[i] = (point_cloud, texture)
+
+    return images, points, point_clouds
+
+
+def _uncrop(image, u0, v0, calibration_data):
+    full = np.zeros((calibration_data.height, calibration_data.width), image.dtype)
+    h, w = image.shape
+    full[v0:v0 + h, u0:u0 + w] = image
+    return full
+
+
+def _sample_texture(texture, u, v):
+    height, width = texture.shape[:2]
+    u = np.clip(np.around(u), 0, width - 1).astype(int)
+    v = np.clip(np.around(v), 0, height - 1).astype(int)
+    return texture[v, u].T
+
+
+def engine_config(laser_segmentation, calibration_data, bicolor=False, undistort=False):
+    """Snapshot of the settings needed to compute captures in other process"""
+    config = {}
+    config['bicolor'] = bicolor
+    config['undistort'] = undistort
+    config['segmentation'] = dict(
+        (name, getattr(laser_segmentation, name)) for name in SEGMENTATION_FIELDS)
+    config['resolution'] = (calibration_data.width, calibration_data.height)
+    config['camera_matrix'] = calibration_data.camera_matrix
+    config['distortion_vector'] = calibration_data.distortion_vector
+    config['laser_planes'] = [(plane.distance, plane.normal)
+                              for plane in calibration_data.laser_planes]
+    config['platform_rotation'] = calibration_data.platform_rotation
+    config['platform_translation'] = calibration_data.platform_translation
+    return config
+
+
+def _configure(config):
+    laser_segmentation = LaserSegmentation()
+    for name, value in config['segmentation'].items():
+        setattr(laser_segmentation, name, value)
+    calibration_data = CalibrationData()
+    calibration_data.set_resolution(*config['resolution'])
+    calibration_data.camera_matrix = config['camera_matrix']
+    calibration_data.distortion_vector = config['distortion_vector']
+    for i, (distance, normal) in enumerate(config['laser_planes']):
+        calibration_data.laser_planes[i].distance = distance
+        calibration_data.laser_planes[i].normal = normal
+    calibration_data.platform_rotation = config['platform_rotation']
+    calibration_data.platform_translation = config['platform_translation']
+    return laser_segmentation, PointCloudGeneration()
+
+
+def _slot_images(slot, shape):
+    """Segmented images stored at the end of a shared memory slot"""
+    height, width = shape
+    size = height * width
+    data = np.frombuffer(slot, dtype=np.uint8)
+    return [data[9 * size:10 * size].reshape(height, width),
+            data[10 * size:11 * size].reshape(height, width)]
+
+
+def _pack(slot, arrays):
+    """Copy the arrays (texture and lasers, any size) at the beginning of a
+       shared memory slot and return their layout"""
+    data = np.frombuffer(slot, dtype=np.uint8)
+    layout = []
+    offset = 0
+    for array in arrays:
+        if array is None:
+            layout.append(None)
+        else:
+            data[offset:offset + array.size] = array.ravel()
+            layout.append((offset, array.shape))
+            offset += array.size
+    return layout
+
+
+def _unpack(slot, layout):
+    data = np.frombuffer(slot, dtype=np.uint8)
+    arrays = []
+    for item in layout:
+        if item is None:
+            arrays.append(None)
+        else:
+            offset, shape = item
+            arrays.append(data[offset:offset + int(np.prod(shape))].reshape(shape))
+    return arrays
+
+
+def _worker(slots, shape, tasks, results, config):
+    laser_segmentation, point_cloud_generation = _configure(config)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        index, slot, theta, texture_theta, offset, layout = task
+        images = _slot_images(slots[slot], shape)
+        capture = ScanCapture()
+        capture.theta = theta
+        capture.texture_theta = texture_theta
+        capture.offset = offset
+        capture.texture, capture.lasers[0], capture.lasers[1] = _unpack(slots[slot], layout)
+        try:
+            segmented, points, point_clouds = compute_capture(
+                capture, laser_segmentation, point_cloud_generation,
+                config['bicolor'], config['undistort'])
+            for i in xrange(2):
+                if segmented[i] is not None:
+                    images[i][:] = segmented[i]
+            has_images = [image is not None for image in segmented]
+        except Exception as e:
+            logger.error("Error processing capture {0}: {1}".format(index, e))
+            points, point_clouds, has_images = [None, None], [None, None], [False, False]
+        results.put((index, slot, has_images, points, point_clouds))
+
+
+class CapturePool(object):
+
+    """Pool of processes that compute scan captures in parallel
+
+    Frames are transferred through shared memory slots. Results are
+    returned in the same order as the captures were put.
+    """
+
+    def __init__(self, workers=2):
+        self.workers = workers
+        self._shape = None
+        self._slots = []
+        self._free_slots = []
+        self._processes = []
+        self._tasks = None
+        self._results = None
+        self._pending = {}
+        self._put_index = 0
+        self._get_index = 0
+
+    def start(self, width, height, config):
+        self._shape = (height, width)
+        self._slots = [RawArray(ctypes.c_uint8, 11 * width * height)
+                       for _ in xrange(2 * self.workers)]
+        self._free_slots = range(len(self._slots))
+        self._tasks = multiprocessing.Queue()
+        self._results = multiprocessing.Queue()
+        self._pending = {}
+        self._put_index = 0
+        self._get_index = 0
+        self._processes = []
+        for _ in xrange(self.workers):
+            process = multiprocessing.Process(
+                target=_worker,
+                args=(self._slots, self._shape, self._tasks, self._results, config))
+            process.daemon = True
+            process.start()
+            self._processes.append(process)
+
+    def stop(self):
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self._slots = []
+        self._free_slots = []
+        self._pending = {}
+
+    def put(self, capture):
+        """Copy the capture into a free slot and queue it. Blocks until a slot is
+           free. Raise WorkersError if no worker is alive"""
+        while len(self._free_slots) == 0:
+            if not self._collect(block=True) and \
+               not any(process.is_alive() for process in self._processes):
+                raise WorkersError()
+        slot = self._free_slots.pop()
+        layout = _pack(self._slots[slot], [capture.texture] + capture.lasers)
+        self._tasks.put((self._put_index, slot, capture.theta, capture.texture_theta,
+                         capture.offset, layout))
+        self._put_index += 1
+
+    def get(self):
+        """Return the processed captures ready in order, without blocking"""
+        ret = []
+        while self._collect(block=False):
+            pass
+        while self._get_index in self._pending:
+            ret.append(self._pending.pop(self._get_index))
+            self._get_index += 1
+        return ret
+
+    def join(self):
+        """Return all the remaining processed captures in order"""
+        while len(self._pending) + self._get_index < self._put_index:
+            if not self._collect(block=True) and \
+               not any(process.is_alive() for process in self._processes):
+                break
+        return self.get()
+
+    def _collect(self, block):
+        try:
+            index, slot, has_images, points, point_clouds = self._results.get(block, 1)
+        except Queue.Empty:
+            return False
+        slot_images = _slot_images(self._slots[slot], self._shape)
+        images = [slot_images[i].copy() if has_images[i] else None for i in xrange(2)]
+        self._free_slots.append(slot)
+        self._pending[index] = (images, points, point_clouds)
+        return True
@@ -5,15 +5,21 @@ __author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
 __copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
 __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
 
+import cv2
 import time
 import Queue
+import threading
+import collections
 import numpy as np
 import datetime
 
 from horus import Singleton
 from horus.engine.scan.scan import Scan
-from horus.engine.scan.scan_capture import ScanCapture
+from horus.engine.scan.scan_capture import ScanCapture, compact_capture
 from horus.engine.scan.current_video import CurrentVideo
+from horus.engine.scan.range_image import RangeImage
+from horus.engine.scan.capture_pool import CapturePool, WorkersError, compute_capture, \
+    engine_config
 from horus.engine.calibration.calibration_data import CalibrationData
 
 import logging
@@ -23,6 +29,12 @@ import platform
 system = platform.system()
 
 
+def _angle(value):
+    """Absolute angle difference in radians, modulo a revolution"""
+    value = abs(value) % (2 * np.pi)
+    return min(value, 2 * np.pi - value)
+
+
 class ScanError(Exception):
 
     def __init__(self):
@@ -45,16 +57,31 @@ class CiclopScan(Scan):
         self.capture_texture = True
         self.laser = [True, True]
         self.move_motor = True
+        self.continuous = False
+        self.split_lasers = False
+        self.two_pass = False
+        self.texture_keyframes = 1
+        self.compact_captures = False
+        self.organized = False
+        self.range_image = None
         self.motor_step = 0
         self.motor_speed = 0
         self.motor_acceleration = 0
         self.color = (0, 0, 0)
+        self.process_workers = 0
 
         self._theta = 0
         self._debug = False
         self._bicolor = False
-        self._scan_sleep = 0.05
+        self._scan_sleep = 0
         self._captures_queue = Queue.Queue(10)
+        self._capture_pool = None
+        self._split_center = None
+        self._moved = threading.Event()
+        self._moved.set()
+        self._timings = {}
+        self._result_thetas = collections.deque()
+        self._capture_error = None
         self.point_cloud_callback = None
 
     def set_capture_texture(self, value):
@@ -69,6 +96,24 @@ class CiclopScan(Scan):
     def set_move_motor(self, value):
         self.move_motor = value
 
+    def set_continuous(self, value):
+        self.continuous = value
+
+    def set_split_lasers(self, value):
+        self.split_lasers = value
+
+    def set_two_pass(self, value):
+        self.two_pass = value
+
+    def set_texture_keyframes(self, value):
+        self.texture_keyframes = value
+
+    def set_compact_captures(self, value):
+        self.compact_captures = value
+
+    def set_organized(self, value):
+        self.organized = value
+
     def set_motor_step(self, value):
         self.motor_step = value
 
@@ -84,13 +129,63 @@ class CiclopScan(Scan):
     def set_scan_sleep(self, value):
         self._scan_sleep = value / 1000.
 
+    def set_process_workers(self, value):
+        self.process_workers = value
+
+    def organized_point_cloud(self, max_jump=4):
+        """Point cloud and texture of the range image without isolated points
+           and spikes of more than max_jump pixels. None if not organized"""
+        if self.range_image is None:
+            return None
+        removed = self.range_image.remove_isolated()
+        removed += self.range_image.remove_spikes(max_jump)
+        logger.info("Organized scan: {0} points, {1} removed".format(
+            self.range_image.count(), removed))
+        return self.range_image.point_cloud(self.point_cloud_generation,
+                                            self._undistort_points())
+
     def _initialize(self):
         self.image = None
         self.image_capture.stream = False
+        self.image_capture.set_use_background_model(
+            self.image_capture.background_model.refresh > 1)
         self._theta = 0
         self._progress = 0
         self._captures_queue.queue.clear()
         self._begin = time.time()
+        self._end = self._begin
+        self._moved.set()
+        self._timings = dict.fromkeys(['texture', 'lasers', 'motion', 'step'], 0.0)
+        self._steps = 0
+        self._texture_index = 0
+        self._keyframes = []
+        self._pending_textures = []
+        self._compact_texture = (None, None)
+        self._result_thetas.clear()
+        self._capture_error = None
+
+        # Keep the results in a (step, row, laser) grid
+        self.range_image = None
+        if self.organized and self.motor_step != 0:
+            self.range_image = RangeImage(int(round(360.0 / abs(self.motor_step))),
+                                          self.calibration_data.height)
+
+        # Both lasers in one frame, split at the platform center
+        self._split_center = None
+        if self.split_lasers and self.laser[0] and self.laser[1]:
+            self._split_center = self.point_cloud_roi.get_center_u()
+            if self._split_center is None:
+                logger.warning("Platform center not available: capture lasers separately")
+
+        # Setup process workers
+        if self.process_workers > 0:
+            self._capture_pool = CapturePool(self.process_workers)
+            self._capture_pool.start(
+                self.calibration_data.width, self.calibration_data.height,
+                engine_config(self.laser_segmentation, self.calibration_data,
+                              self._bicolor, self._undistort_points()))
+        else:
+            self._capture_pool = None
 
         # Setup console
         logger.info("Start scan")
@@ -112,12 +207,64 @@ class CiclopScan(Scan):
             self.driver.board.motor_disable()
 
     def _capture(self):
+        try:
+            if self.continuous and self.move_motor:
+                self._capture_continuous()
+            elif self.two_pass and self.capture_texture and self.move_motor:
+                self._capture_two_pass()
+            else:
+                self._capture_steps(self._capture_images)
+        except Exception as e:
+            logger.error("Capture error: {0}".format(e))
+            self._capture_error = e
+            self.is_scanning = False
+            self._moved.set()
+        finally:
+            # Notify the end of the captures to the process thread
+            self._captures_queue.put(None)
+
+        self.image_capture.set_motion(None)
+        self.image_capture.set_use_background_model(False)
+        self._moved.wait()
+        self.driver.board.lasers_off()
+        self.driver.board.motor_disable()
+
+    def _capture_two_pass(self):
+        """Capture all the textures in a first revolution and all the lasers
+           in a second one, so the camera mode is not switched at each step.
+           Textures are stored as JPEG and joined to the lasers by theta"""
+        textures = []
+
+        def capture_texture():
+            texture = self.image_capture.capture_texture()
+            self.current_video.set_texture(texture)
+            if texture is not None:
+                texture = cv2.imencode('.jpg', texture, [cv2.IMWRITE_JPEG_QUALITY, 95])[1]
+            textures.append(texture)
+
+        def capture_lasers():
+            texture = next(encoded, None)
+            if texture is not None:
+                texture = cv2.imdecode(texture, cv2.IMREAD_COLOR)
+            return self._capture_images(texture)
+
+        self._capture_steps(capture_texture, revolutions=2)
+        if self.is_scanning:
+            self._theta = 0
+            encoded = iter(textures)
+            self._capture_steps(capture_lasers, revolution=1, revolutions=2)
+
+    def _capture_steps(self, capture_step, revolution=0, revolutions=1):
+        """Capture a revolution in motor steps. capture_step returns the
+           capture to process, if any"""
         # Flush buffer of texture captures
         self.image_capture.flush_laser()
         while self.is_scanning:
             if self._inactive:
                 self.image_capture.stream = True
-                time.sleep(0.1)
+                # Wait until resume or stop
+                self._wait_active()
+                self.image_capture.background_model.reset()
             else:
                 self.image_capture.stream = False
                 if abs(self._theta) >= 360.0:
@@ -126,31 +273,32 @@ class CiclopScan(Scan):
                     begin = time.time()
                     try:
                         # Capture images
-                        capture = self._capture_images()
+                        capture = capture_step()
                         # Put images into queue
-                        self._captures_queue.put(capture)
+                        if capture is not None:
+                            for capture in self._join_texture(capture):
+                                self._queue_capture(capture)
                     except Exception as e:
+                        # The process thread reports the error
+                        self._capture_error = e
                         self.is_scanning = False
-                        response = (False, e)
-                        if self._after_callback is not None:
-                            self._after_callback(response)
                         break
 
-                    # Move motor
-                    if self.move_motor:
-                        self.driver.board.motor_move(self.motor_step)
-                    else:
-                        time.sleep(0.130)  # Time for 0.45º movement
+                    # Move motor. The next step settles during the motion
+                    self._move()
 
                     # Update theta
                     self._theta += self.motor_step
                     # Refresh progress
                     if self.motor_step != 0:
-                        self._progress = abs(self._theta / self.motor_step)
-                        self._range = abs(360.0 / self.motor_step)
+                        steps = abs(360.0 / self.motor_step)
+                        self._progress = abs(self._theta / self.motor_step) + revolution * steps
+                        self._range = revolutions * steps
 
                     # Print info
                     self._end = time.time()
+                    self._timings['step'] += self._end - begin
+                    self._steps += 1
                     string_time = str(datetime.datetime.now())[:-3] + " - "
 
                     if self._debug and system == 'Linux':
@@ -162,69 +310,270 @@ class CiclopScan(Scan):
                             time.strftime("%M' %S\"", time.gmtime(self._end - self._begin)))
                         print string_time + " elapsed angle: {0}º".format(
                             float(self._theta))
-                        print string_time + " capture: {0} ms".format(
-                            int((self._end - begin) * 1000))
-            # Sleep
-            time.sleep(self._scan_sleep)
+                        print string_time + " capture: {0} ms ({1})".format(
+                            int((self._end - begin) * 1000), self._timings_info())
+
+                    # Optional wait between scan intervals
+                    if self._scan_sleep > 0:
+                        time.sleep(self._scan_sleep)
+
+        # Captures after the last keyframe
+        for capture in self._join_texture(None):
+            self._queue_capture(capture)
+
+    def _capture_continuous(self):
+        """Turn the platform at constant speed while the camera streams.
+           Laser frames alternate with laser-off frames, used as background
+           and texture of the laser frames between them. Theta comes from
+           the frame timestamps and the motion profile"""
+        remove_background = self.image_capture.get_remove_background()
+        laser_off = remove_background or self.capture_texture
+        cycle = []
+        for i in xrange(2):
+            if self.laser[i]:
+                if laser_off:
+                    cycle.append([False, False])
+                if self._split_center is not None:
+                    cycle.append([True, True])
+                    break
+                cycle.append([i == 0, i == 1])
+        if len(cycle) == 0:
+            return
+
+        # The platform turns at the motor speed. The angle between the
+        # captures of a laser is the speed times the cycle time
+        camera = self.driver.camera
+        frame_time = (1 + self.image_capture.get_flush_laser()) * camera._frame_period()
+        self._moved.clear()
+        self.driver.board.motor_move(np.copysign(360.0, self.motor_step or 1), nonblocking=True,
+                                     callback=lambda r: self._moved.set())
+        logger.info("Continuous rotation at {0:.2f} º/s, {1:.2f} º per capture".format(
+            self.motor_speed, self.motor_speed * len(cycle) * frame_time))
+
+        background = None
+        pending = None
+        index = 0
+        while self.is_scanning:
+            if self._inactive:
+                # Hold the platform until resume or stop
+                self.driver.board.motor_hold()
+                self._wait_active()
+                self.driver.board.motor_resume()
+                continue
+            if abs(self._theta) >= 360.0:
+                break
+            state = cycle[index % len(cycle)]
+            index += 1
+            image = self.image_capture.capture_laser_frame(state)
+            if image is None:
+                if self._moved.is_set() and not self.driver.board.is_moving():
+                    # The revolution ended without frames
+                    break
+                continue
+            theta = self.driver.board.motion_offset(camera.last_timestamp)
+            if not any(state):
+                if pending is not None:
+                    self._queue_capture(self._laser_capture(pending, background, image))
+                    pending = None
+                background = image
+            else:
+                pending = (None if all(state) else state.index(True), theta, image)
+                if not laser_off:
+                    self._queue_capture(self._laser_capture(pending, None, None))
+                    pending = None
+
+            # Refresh progress
+            self._theta = theta
+            self._end = time.time()
+            self._steps += 1
+            if self.motor_step != 0:
+                self._progress = abs(self._theta / self.motor_step)
+                self._range = abs(360.0 / self.motor_step)
+
+        if pending is not None:
+            self._queue_capture(self._laser_capture(pending, background, None))
+
+    def _laser_capture(self, pending, previous, following):
+        index, theta, image = pending
+        capture = ScanCapture()
+        capture.theta = np.deg2rad(theta)
+        if previous is not None and following is not None:
+            background = cv2.addWeighted(previous, 0.5, following, 0.5, 0)
+        elif previous is not None:
+            background = previous
+        else:
+            background = following
+        if background is not None and self.image_capture.get_remove_background():
+            image = cv2.subtract(image, background)
+        if index is None:
+            capture.lasers = self.image_capture.split_lasers(image, self._split_center)
+        else:
+            capture.lasers[index] = image
+        if self.capture_texture and background is not None:
+            capture.texture = background
+        else:
+            capture.texture = self._color_texture()
 
-        self.driver.board.lasers_off()
-        self.driver.board.motor_disable()
+        # Set current video images
+        self.current_video.set_texture(capture.texture)
+        self.current_video.set_laser(capture.lasers)
+        return capture
 
-    def _capture_images(self):
+    def _color_texture(self):
+        r, g, b = self.color
+        ones = np.zeros((self.calibration_data.height,
+                         self.calibration_data.width, 3), np.uint8)
+        ones[:, :, 0] = r
+        ones[:, :, 1] = g
+        ones[:, :, 2] = b
+        return ones
+
+    def _capture_images(self, texture=None):
         capture = ScanCapture()
         capture.theta = np.deg2rad(self._theta)
 
-        if self.capture_texture:
+        begin = time.time()
+        motion = self._timings['motion']
+        if texture is not None:
+            capture.texture = texture
+        elif self.capture_texture and self._texture_index % self.texture_keyframes != 0:
+            # Colors from the nearest keyframe
+            self._texture_index += 1
+        elif self.capture_texture:
+            self._texture_index += 1
             capture.texture = self.image_capture.capture_texture()
             # Flush buffer to improve the synchronization when
             # the texture exposure is around 33 ms
             self.image_capture.flush_laser()
         else:
-            r, g, b = self.color
-            ones = np.zeros((self.calibration_data.height,
-                             self.calibration_data.width, 3), np.uint8)
-            ones[:, :, 0] = r
-            ones[:, :, 1] = g
-            ones[:, :, 2] = b
-            capture.texture = ones
-
-        if self.laser[0] and self.laser[1]:
+            capture.texture = self._color_texture()
+        self._timings['texture'] += time.time() - begin - (self._timings['motion'] - motion)
+
+        begin = time.time()
+        motion = self._timings['motion']
+        if self._split_center is not None:
+            capture.lasers = self.image_capture.capture_lasers_split(self._split_center)
+        elif self.laser[0] and self.laser[1]:
             capture.lasers = self.image_capture.capture_lasers()
         else:
             for i in xrange(2):
                 if self.laser[i]:
                     capture.lasers[i] = self.image_capture.capture_laser(i)
+        self._timings['lasers'] += time.time() - begin - (self._timings['motion'] - motion)
 
         # Set current video images
-        self.current_video.set_texture(capture.texture)
+        if capture.texture is not None:
+            self.current_video.set_texture(capture.texture)
         self.current_video.set_laser(capture.lasers)
 
         return capture
 
+    def _queue_capture(self, capture):
+        if self.compact_captures:
+            # Keyframe textures are shared by several captures
+            texture, encoded = self._compact_texture
+            if capture.texture is not texture:
+                texture, encoded = capture.texture, None
+            compact_capture(capture, self.laser_segmentation.compute_red_channel,
+                            self.point_cloud_roi.get_roi(), encoded)
+            self._compact_texture = (texture, capture.texture)
+        self._captures_queue.put(capture)
+
+    def _join_texture(self, capture):
+        """Captures without texture wait for the next keyframe and take the
+           texture of the nearest one. None flushes the waiting captures"""
+        if capture is not None and capture.texture is None:
+            self._pending_textures.append(capture)
+            return []
+        keyframes = self._keyframes[-1:]
+        if capture is not None:
+            self._keyframes = self._keyframes[:1] + [capture]
+            keyframes.append(capture)
+        elif len(self._keyframes) > 0:
+            # The first keyframe is also next to the last steps
+            keyframes.append(self._keyframes[0])
+        for pending in self._pending_textures:
+            if len(keyframes) > 0:
+                keyframe = min(keyframes, key=lambda k: _angle(k.theta - pending.theta))
+                pending.texture = keyframe.texture
+                pending.texture_theta = keyframe.theta
+            else:
+                pending.texture = self._color_texture()
+        ready = self._pending_textures
+        self._pending_textures = []
+        if capture is not None:
+            ready.append(capture)
+        return ready
+
+    def _move(self):
+        """Start the motion of the platform without waiting for it"""
+        self._moved.clear()
+        if self.move_motor and self.driver.board._is_connected:
+            self.driver.board.motor_move(self.motor_step, nonblocking=True,
+                                         callback=lambda r: self._moved.set())
+        else:
+            self._moved.set()
+        self.image_capture.set_motion(self._wait_motion)
+
+    def _wait_motion(self):
+        """Block until the platform is stationary"""
+        begin = time.time()
+        self._moved.wait()
+        self.driver.board.motor_wait()
+        self._timings['motion'] += time.time() - begin
+
+    def _timings_info(self):
+        steps = max(self._steps, 1)
+        return ", ".join("{0} {1} ms".format(key, int(1000 * self._timings[key] / steps))
+                         for key in ['texture', 'lasers', 'motion', 'step'])
+
     def _process(self):
         ret = False
-        while self.is_scanning:
-            if self._inactive:
-                self.image_detection.stream = True
-                time.sleep(0.1)
-            else:
-                self.image_detection.stream = False
-                if self._theta >= 360.0:
+        while True:
+            # Wait for the next capture
+            capture = self._captures_queue.get()
+            self._captures_queue.task_done()
+            if capture is None:
+                # Capture thread finished
+                if self.is_scanning and abs(self._theta) >= 360.0:
+                    if self._capture_pool is not None:
+                        # Process captures in flight
+                        for result in self._capture_pool.join():
+                            self._update_result(*result)
                     self.is_scanning = False
                     ret = True
-                    break
+                break
+            if self._inactive:
+                self.image_detection.stream = True
+                # Wait until resume or stop
+                self._wait_active()
+            self.image_detection.stream = False
+            if self.is_scanning:
+                self._result_thetas.append(capture.theta)
+                # Process capture
+                if self._capture_pool is None:
+                    self._process_capture(capture)
                 else:
-                    if not self._captures_queue.empty():
-                        # Get capture from queue
-                        capture = self._captures_queue.get(timeout=0.1)
-                        self._captures_queue.task_done()
-                        # Process capture
-                        self._process_capture(capture)
-            # Sleep
-            time.sleep(self._scan_sleep)
+                    try:
+                        self._capture_pool.put(capture)
+                    except WorkersError as e:
+                        # Stop the captures and wait for the end of the thread
+                        logger.error("Process error: {0}".format(e))
+                        self._capture_error = e
+                        self.is_scanning = False
+                        continue
+                    # Update processed captures in theta order
+                    for result in self._capture_pool.get():
+                        self._update_result(*result)
+
+        if self._capture_pool is not None:
+            self._capture_pool.stop()
+            self._capture_pool = None
 
         if ret:
             response = (True, None)
+        elif self._capture_error is not None:
+            response = (False, self._capture_error)
         else:
             response = (False, ScanError())
 
@@ -240,53 +589,43 @@ class CiclopScan(Scan):
         logger.info("Finish scan {0} %  Time {1}".format(
             progress,
             time.strftime("%M' %S\"", time.gmtime(self._end - self._begin))))
+        logger.info("Step time: {0}".format(self._timings_info()))
 
         if self._after_callback is not None:
             self._after_callback(response)
 
     def _process_capture(self, capture):
-        # Current video arrays
-        image = None
-        images = [None, None]
-        points = [None, None]
-
         # begin = time.time()
 
-        for i in xrange(2):
-            if capture.lasers[i] is not None:
-                image = capture.lasers[i]
-                self.image = image
-                # Compute 2D points from images
-                points_2d, image = self.laser_segmentation.compute_2d_points(image)
-                images[i] = image
-                points[i] = points_2d
-                # Compute point cloud from 2D points
-                point_cloud = self.point_cloud_generation.compute_point_cloud(
-                    capture.theta, points_2d, i)
-                # Compute point cloud texture
-                u, v = points_2d
-
-                if self._bicolor:
-                    if i == 0:
-                        r, g, b = 255, 0, 0
-                    else:
-                        r, g, b = 0, 255, 0
-                    texture = np.zeros((3, len(v)), np.uint8)
-                    texture[0, :] = r
-                    texture[1, :] = g
-                    texture[2, :] = b
-                else:
-                    texture = capture.texture[v, np.around(u).astype(int)].T
+        # Compute 2D points, point clouds and textures
+        images, points, point_clouds = compute_capture(
+            capture, self.laser_segmentation, self.point_cloud_generation,
+            self._bicolor, self._undistort_points())
+        self._update_result(images, points, point_clouds)
+
+        # Print info
+        """if self._debug and system == 'Linux':
+            print string_time + " process: {0} ms".format(
+                int((time.time() - begin) * 1000))"""
 
+    def _undistort_points(self):
+        return self.image_capture.use_distortion and self.image_capture.undistort_points
+
+    def _update_result(self, images, points, point_clouds):
+        # Results are updated in the order of the captures
+        theta = None
+        if len(self._result_thetas) > 0:
+            theta = self._result_thetas.popleft()
+        image = None
+        for i in xrange(2):
+            if images[i] is not None:
+                image = images[i]
+            if point_clouds[i] is not None:
+                if self.range_image is not None and theta is not None:
+                    self.range_image.add(theta, i, points[i], point_clouds[i][1])
                 if self.point_cloud_callback:
-                    self.point_cloud_callback(self._range, self._progress,
-                                              (point_cloud, texture))
+                    self.point_cloud_callback(self._range, self._progress, point_clouds[i])
 
         # Set current video images
         self.current_video.set_gray(images)
         self.current_video.set_line(points, image)
-
-        # Print info
-        """if self._debug and system == 'Linux':
-            print string_time + " process: {0} ms".format(
-                int((time.time() - begin) * 1000))"""
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+import threading
+import numpy as np
+
+from horus import __version__
+from horus.util.mesh_loaders import ply
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class PointCloudSink(object):
+
+    """Binary PLY file that grows with the point cloud slices of a scan
+
+    The slices are buffered in memory up to buffer_size points and appended
+    to the file. The vertex count of the header is padded, and it is patched
+    at each flush, so the file is a valid PLY until the last flush if the
+    scan is interrupted.
+
+        sink = PointCloudSink(filename)
+        sink.open()
+        sink.append(points, colors)
+        sink.close()
+    """
+
+    count_width = 12
+
+    def __init__(self, filename, buffer_size=262144):
+        self.filename = filename
+        self.buffer_size = buffer_size
+        self.count = 0
+
+        self._file = None
+        self._buffer = []
+        self._buffered = 0
+        self._count_offset = 0
+        self._dtype = ply.vertex_dtype(colors=True)
+        self._lock = threading.Lock()
+
+    def open(self):
+        header = ply.write_header(' ' * self.count_width,
+                                  comment="Generated by Horus {0}".format(__version__))
+        self._count_offset = header.index('element vertex ') + len('element vertex ')
+        self._file = open(self.filename, 'wb')
+        self._file.write(header)
+        self.count = 0
+        self._buffer = []
+        self._buffered = 0
+        self._patch_count()
+
+    def append(self, points, colors):
+        """Append a (3, N) block of points and its (3, N) colors"""
+        data = np.empty(points.shape[1], self._dtype)
+        data['v'] = points.T
+        data['c'] = colors.T
+        with self._lock:
+            if self._file is None:
+                return
+            self._buffer.append(data)
+            self._buffered += len(data)
+            if self._buffered >= self.buffer_size:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._flush()
+                self._file.close()
+                self._file = None
+                logger.info("Point cloud saved: {0} ({1} points)".format(
+                    self.filename, self.count))
+
+    def is_open(self):
+        return self._file is not None
+
+    def _flush(self):
+        for data in self._buffer:
+            self._file.write(data.tostring())
+        self.count += self._buffered
+        self._buffer = []
+        self._buffered = 0
+        self._patch_count()
+
+    def _patch_count(self):
+        position = self._file.tell()
+        self._file.seek(self._count_offset)
+        self._file.write(str(self.count).ljust(self.count_width))
+        self._file.seek(position)
+        self._file.flush()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# This file is part of the Horus Project
+
+__author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
+__copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
+__license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
+
+import math
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class RangeImage(object):
+
+    """Scan results organized in a (step, image row, laser) grid
+
+    Each laser detects at most one point per image row, so a cell only
+    stores the column u of the laser line (NaN if empty). The 3D point is
+    triangulated from (u, v) with the calibration tables when it is needed.
+    The neighbours of a cell are the adjacent rows and steps.
+
+        u       : (steps, height, lasers) float32 laser column
+        theta   : (steps, lasers) platform angle of each column (rad)
+        texture : (steps, height, lasers, 3) uint8 color
+    """
+
+    def __init__(self, steps, height, lasers=2):
+        self.steps = steps
+        self.height = height
+        self.lasers = lasers
+        self.u = np.empty((steps, height, lasers), np.float32)
+        self.u.fill(np.nan)
+        self.theta = np.zeros((steps, lasers), np.float64)
+        self.texture = np.zeros((steps, height, lasers, 3), np.uint8)
+
+    @property
+    def mask(self):
+        return ~np.isnan(self.u)
+
+    def count(self):
+        return np.count_nonzero(self.mask)
+
+    def step_index(self, theta):
+        return int(round(theta * self.steps / (2 * math.pi))) % self.steps
+
+    def add(self, theta, index, points_2d, texture=None):
+        """Store the 2D points of a laser detected with the platform at theta"""
+        u, v = points_2d
+        v = np.asarray(v).astype(int)
+        valid = (v >= 0) & (v < self.height)
+        step = self.step_index(theta)
+        self.theta[step, index] = theta
+        self.u[step, v[valid], index] = np.asarray(u)[valid]
+        if texture is not None:
+            self.texture[step, v[valid], index] = texture.T[valid]
+
+    def point_cloud(self, point_cloud_generation, undistort=False):
+        """Triangulate the (3, N) point cloud and its (3, N) texture. Points
+           are sorted by laser, step and row, as the indexes of faces"""
+        point_cloud_generation.scan_context.update()
+        mask = self.mask
+        points = []
+        textures = []
+        for index in xrange(self.lasers):
+            step, v = np.nonzero(mask[:, :, index])
+            points_2d = (self.u[step, v, index], v)
+            if undistort:
+                points_2d = point_cloud_generation.undistort_points(points_2d)
+            Xwo = point_cloud_generation.scan_context.compute_platform_point_cloud(
+                points_2d, index)
+            # Rotate each column to world coordinates
+            theta = self.theta[step, index]
+            c, s = np.cos(-theta), np.sin(-theta)
+            Xw = np.empty(Xwo.shape, np.float32)
+            Xw[0] = c * Xwo[0] - s * Xwo[1]
+            Xw[1] = s * Xwo[0] + c * Xwo[1]
+            Xw[2] = Xwo[2]
+            points.append(Xw)
+            textures.append(self.texture[step, v, index].T)
+        return np.hstack(points), np.hstack(textures)
+
+    def remove_isolated(self, min_neighbours=2):
+        """Remove the points with less than min_neighbours points in the
+           adjacent cells of the same laser. Return the number of points removed"""
+        mask = self.mask
+        neighbours = np.zeros(mask.shape, np.uint8)
+        padded = np.zeros((self.steps, self.height + 2, self.lasers), np.uint8)
+        padded[:, 1:-1] = mask
+        for ds in (-1, 0, 1):
+            rolled = np.roll(padded, ds, axis=0)
+            for dv in (0, 1, 2):
+                if ds != 0 or dv != 1:
+                    neighbours += rolled[:, dv:dv + self.height]
+        isolated = mask & (neighbours < min_neighbours)
+        self.u[isolated] = np.nan
+        return np.count_nonzero(isolated)
+
+    def remove_spikes(self, max_jump):
+        """Remove the points whose column differs more than max_jump pixels
+           from the rows above and below. Return the number of points removed"""
+        # Empty neighbours are jumps
+        jump = ~(np.abs(self.u[:, 1:] - self.u[:, :-1]) <= max_jump)
+        spikes = self.mask
+        spikes[:, 1:] &= jump
+        spikes[:, :-1] &= jump
+        self.u[spikes] = np.nan
+        return np.count_nonzero(spikes)
+
+    def faces(self, max_jump=None):
+        """(M, 3) triangles between adjacent points of the grid, with the
+           indexes of point_cloud. Cells whose columns differ more than
+           max_jump pixels are not joined"""
+        mask = self.mask
+        ids = np.cumsum(np.rollaxis(mask, 2).ravel()) - 1
+        ids = np.rollaxis(ids.reshape(self.lasers, self.steps, self.height), 0, 3)
+        # Quads of the cells (s, v), (s, v + 1), (s + 1, v + 1), (s + 1, v)
+        next_step = np.roll(np.arange(self.steps), -1)
+        corners = [(slice(None), slice(None, -1)), (slice(None), slice(1, None)),
+                   (next_step, slice(1, None)), (next_step, slice(None, -1))]
+        valid = np.ones((self.steps, self.height - 1, self.lasers), bool)
+        for s, v in corners:
+            valid &= mask[s, v]
+        if max_jump is not None:
+            u = [self.u[s, v] for s, v in corners]
+            for a in xrange(4):
+                valid &= np.abs(u[a] - u[(a + 1) % 4]) <= max_jump
+        quads = [ids[s, v][valid] for s, v in corners]
+        return np.vstack((np.array([quads[0], quads[1], quads[2]]).T,
+                          np.array([quads[0], quads[2], quads[3]]).T))
@@ -35,6 +35,8 @@ class Scan(object):
         self._progress = 0
         self._range = 0
         self._inactive = False
+        self._active = threading.Event()
+        self._active.set()
 
     def set_callbacks(self, before, progress, after):
         self._before_callback = before
@@ -53,6 +55,7 @@ class Scan(object):
 
             self.is_scanning = True
             self._inactive = False
+            self._active.set()
 
             threading.Thread(target=self._capture).start()
             threading.Thread(target=self._process).start()
@@ -60,12 +63,19 @@ class Scan(object):
     def stop(self):
         self._inactive = False
         self.is_scanning = False
+        self._active.set()
 
     def pause(self):
         self._inactive = True
+        self._active.clear()
 
     def resume(self):
         self._inactive = False
+        self._active.set()
+
+    def _wait_active(self):
+        """Block the calling thread while the scan is paused"""
+        self._active.wait()
 
     def _initialize(self):
         pass
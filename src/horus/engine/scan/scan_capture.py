@@ -5,10 +5,47 @@ __author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
 __copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
 __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
 
+import cv2
+import numpy as np
+
 
 class ScanCapture(object):
 
     def __init__(self):
         self.theta = 0
         self.texture = None
+        self.texture_theta = None
         self.lasers = [None, None]
+        # Image position (u, v) of the first pixel of cropped frames
+        self.offset = (0, 0)
+
+
+def compact_capture(capture, red_channel, roi=None, texture=None, quality=95):
+    """Reduce the capture to the data used to compute it: one channel laser
+       frames and JPEG texture, cropped to the ROI bounds (umin, umax, vmin, vmax).
+       The texture can be given already encoded"""
+    if roi is not None:
+        umin, umax, vmin, vmax = roi
+        capture.offset = (umin, vmin)
+    for i in xrange(2):
+        if capture.lasers[i] is not None:
+            image = capture.lasers[i]
+            if roi is not None:
+                image = image[vmin:vmax, umin:umax]
+            capture.lasers[i] = np.ascontiguousarray(red_channel(image))
+    if texture is not None:
+        capture.texture = texture
+    elif capture.texture is not None:
+        image = capture.texture
+        if roi is not None:
+            image = image[vmin:vmax, umin:umax]
+        capture.texture = cv2.imencode(
+            '.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].ravel()
+    return capture
+
+
+def decode_texture(texture):
+    """Texture image of a capture, decoded if compact"""
+    if texture is not None and texture.ndim == 1:
+        return cv2.imdecode(texture, 1)
+    return texture
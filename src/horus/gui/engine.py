@@ -15,6 +15,7 @@ from horus.engine.calibration.autocheck import Autocheck
 from horus.engine.calibration.laser_triangulation import LaserTriangulation
 from horus.engine.calibration.platform_extrinsics import PlatformExtrinsics
 from horus.engine.calibration.combo_calibration import ComboCalibration
+from horus.engine.calibration.frame_settle import FrameSettle
 from horus.engine.algorithms.image_capture import ImageCapture
 from horus.engine.algorithms.image_detection import ImageDetection
 from horus.engine.algorithms.laser_segmentation import LaserSegmentation
@@ -34,6 +35,7 @@ scanner_autocheck = Autocheck()
 laser_triangulation = LaserTriangulation()
 platform_extrinsics = PlatformExtrinsics()
 combo_calibration = ComboCalibration()
+frame_settle = FrameSettle()
 image_capture = ImageCapture()
 image_detection = ImageDetection()
 laser_segmentation = LaserSegmentation()
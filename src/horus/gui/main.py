@@ -8,6 +8,7 @@ __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.ht
 import gc
 import os
 import time
+import shutil
 import wx._core
 import datetime
 import webbrowser
@@ -15,7 +16,7 @@ from collections import OrderedDict
 
 from horus import __version__, __datetime__, __commit__
 from horus.gui.engine import driver, image_capture, ciclop_scan, scanner_autocheck, \
-    laser_triangulation, platform_extrinsics
+    laser_triangulation, platform_extrinsics, frame_settle
 
 from horus.gui.welcome import WelcomeDialog
 from horus.gui.util.preferences import PreferencesDialog
@@ -220,7 +221,12 @@ class MainWindow(wx.Frame):
             if not filename.endswith('.ply'):
                 if sys.is_linux():  # hack for linux, as for some reason the .ply is not appended.
                     filename += '.ply'
-            mesh_loader.save_mesh(filename, self.workbench['scanning'].scene_view._object)
+            scene_view = self.workbench['scanning'].scene_view
+            if scene_view._object_stream is not None:
+                # The scene only has a preview of the streamed point cloud
+                shutil.copyfile(scene_view._object_stream, filename)
+            else:
+                mesh_loader.save_mesh(filename, scene_view._object)
             self.append_last_file(filename)
         dlg.Destroy()
 
@@ -427,6 +433,42 @@ class MainWindow(wx.Frame):
         self.Layout()
 
     def on_connect(self):
+        camera_id = profile.settings['camera_id']
+        if camera_id in profile.settings['frame_settle']:
+            image_capture.set_settle_values(*profile.settings['frame_settle'][camera_id])
+        elif profile.settings['frame_settle_enable'] and self._ask_frame_settle():
+            # Measure the frames needed by this camera to settle
+            frame_settle.set_callbacks(lambda: wx.CallAfter(self.enable_gui, False),
+                                       None,
+                                       lambda r: wx.CallAfter(self.after_frame_settle, r))
+            frame_settle.start()
+            return
+        self.enable_workbenchs()
+
+    def _ask_frame_settle(self):
+        dlg = wx.MessageDialog(
+            self,
+            _("The frames needed by this camera to settle have not been measured.\n"
+              "The lasers will be switched on and off during the measurement.\n"
+              "Do you want to measure them now?"),
+            _("Frame settle"), wx.YES_NO | wx.ICON_QUESTION)
+        result = dlg.ShowModal() == wx.ID_YES
+        dlg.Destroy()
+        return result
+
+    def after_frame_settle(self, response):
+        ret, result = response
+        if ret:
+            values = dict(profile.settings['frame_settle'])
+            values[profile.settings['camera_id']] = list(result)
+            profile.settings['frame_settle'] = values
+            profile.settings.save_settings(categories=['preferences'])
+            image_capture.set_settle_values(*result)
+        self.enable_gui(True)
+        if driver.is_connected:
+            self.enable_workbenchs()
+
+    def enable_workbenchs(self):
         for workbench in self.workbench.values():
             workbench.enable_content()
         self.workbench[profile.settings['workbench']].on_connect()
@@ -534,6 +576,7 @@ class MainWindow(wx.Frame):
         scanner_autocheck.cancel()
         laser_triangulation.cancel()
         platform_extrinsics.cancel()
+        frame_settle.cancel()
         self.toolbar.update_status(False)
         driver.disconnect()
         dlg = wx.MessageDialog(self, description, title, wx.OK | wx.ICON_ERROR)
@@ -601,6 +644,7 @@ class MainWindow(wx.Frame):
         if len(profile.settings['camera_id']):
             driver.camera.camera_id = int(profile.settings['camera_id'][-1:])
 
+        driver.camera.set_use_grabber(profile.settings['camera_grabber'])
         driver.board.serial_name = profile.settings['serial_name']
         driver.board.baud_rate = profile.settings['baud_rate']
         driver.board.motor_invert(profile.settings['invert_motor'])
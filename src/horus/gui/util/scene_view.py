@@ -60,8 +60,10 @@ class SceneView(opengl_gui.glGuiPanel):
         self._view_roi = False
         self._point_size = 2
 
-        self._object_point_cloud = []
-        self._object_texture = []
+        # Keep one point every preview_step in the scene while scanning.
+        # The full point cloud is streamed to the _object_stream file
+        self.preview_step = 1
+        self._object_stream = None
 
         self.Bind(wx.EVT_MOUSEWHEEL, self.on_mouse_wheel)
         self.Bind(wx.EVT_LEAVE_WINDOW, self.on_mouse_leave)
@@ -102,18 +104,21 @@ class SceneView(opengl_gui.glGuiPanel):
         self._clear_scene()
         self._object = model.Model(None, is_point_cloud=True)
         self._object._add_mesh()
-        self._object._mesh._prepare_vertex_count(4000000)
+        self._object._mesh._prepare_vertex_count(0, normals=False)
+
+    def set_preview_step(self, value):
+        self.preview_step = max(int(value), 1)
+
+    def set_object_stream(self, filename):
+        self._object_stream = filename
 
     def append_point_cloud(self, point, color):
-        self._object_point_cloud.append(point)
-        self._object_texture.append(color)
-        # TODO: optimize
+        if self._object_stream is not None and self.preview_step > 1:
+            point = point[:, ::self.preview_step]
+            color = color[:, ::self.preview_step]
         if self._object is not None:
             if self._object._mesh is not None:
-                for i in xrange(point.shape[1]):
-                    self._object._mesh._add_vertex(
-                        point[0][i], point[1][i], point[2][i],
-                        color[0][i], color[1][i], color[2][i])
+                self._object._mesh._add_points(point, color)
             # Conpute Z center
             if point.shape[1] > 0:
                 zmax = max(point[2])
@@ -155,6 +160,7 @@ class SceneView(opengl_gui.glGuiPanel):
             traceback.print_exc()
 
     def _clear_scene(self):
+        self._object_stream = None
         if self._object is not None:
             if self._object._mesh is not None:
                 if self._object._mesh.vbo is not None and self._object._mesh.vbo.dec_ref():
@@ -64,6 +64,7 @@ class AdjustmentWorkbench(Workbench):
         pattern.square_width = profile.settings['pattern_square_width']
         pattern.distance = profile.settings['pattern_origin_distance']
         image_capture.set_use_distortion(profile.settings['use_distortion'])
+        image_capture.set_undistort_points(False)
         width, height = driver.camera.get_resolution()
         calibration_data.set_resolution(width, height)
         calibration_data.camera_matrix = profile.settings['camera_matrix']
@@ -62,6 +62,10 @@ class ScanCapturePanel(ExpandablePanel):
             'remove_background_scanning', CheckBox,
             _("Capture an extra image without laser to remove "
               "the background in the laser's image"))
+        self.add_control(
+            'background_refresh_scanning', Slider,
+            _("Number of scan steps that share the same background image. "
+              "It is captured again when the ambient light changes"))
 
         # Initial layout
         self._set_mode_layout(profile.settings['capture_mode_scanning'])
@@ -81,6 +85,7 @@ class ScanCapturePanel(ExpandablePanel):
         self.update_callback('saturation_laser_scanning', mode.set_saturation)
         self.update_callback('exposure_laser_scanning', mode.set_exposure)
         self.update_callback('remove_background_scanning', image_capture.set_remove_background)
+        self.update_callback('background_refresh_scanning', image_capture.set_background_refresh)
 
     def on_selected(self):
         current_video.updating = True
@@ -98,6 +103,7 @@ class ScanCapturePanel(ExpandablePanel):
         laser_mode.set_saturation(profile.settings['saturation_laser_scanning'])
         laser_mode.set_exposure(profile.settings['exposure_laser_scanning'])
         image_capture.set_remove_background(profile.settings['remove_background_scanning'])
+        image_capture.set_background_refresh(profile.settings['background_refresh_scanning'])
         profile.settings['current_video_mode_adjustment'] = current_video.mode
         profile.settings['current_panel_adjustment'] = 'scan_capture'
         current_video.flush()
@@ -124,6 +130,7 @@ class ScanCapturePanel(ExpandablePanel):
             self.get_control('saturation_laser_scanning').Show()
             self.get_control('exposure_laser_scanning').Show()
             self.get_control('remove_background_scanning').Show()
+            self.get_control('background_refresh_scanning').Show()
         elif mode == 'Texture':
             self.get_control('brightness_texture_scanning').Show()
             self.get_control('contrast_texture_scanning').Show()
@@ -134,6 +141,7 @@ class ScanCapturePanel(ExpandablePanel):
             self.get_control('saturation_laser_scanning').Hide()
             self.get_control('exposure_laser_scanning').Hide()
             self.get_control('remove_background_scanning').Hide()
+            self.get_control('background_refresh_scanning').Hide()
 
         if sys.is_wx30():
             self.content.SetSizerAndFit(self.content.vbox)
@@ -122,6 +122,7 @@ class CalibrationWorkbench(Workbench):
         laser_mode.saturation = profile.settings['saturation_laser_calibration']
         laser_mode.exposure = profile.settings['exposure_laser_calibration']
         image_capture.set_use_distortion(profile.settings['use_distortion'])
+        image_capture.set_undistort_points(False)
         image_capture.set_remove_background(profile.settings['remove_background_calibration'])
         laser_segmentation.red_channel = profile.settings['red_channel_calibration']
         laser_segmentation.threshold_enable = profile.settings['threshold_enable_calibration']
@@ -131,6 +132,7 @@ class CalibrationWorkbench(Workbench):
         laser_segmentation.window_enable = profile.settings['window_enable_calibration']
         laser_segmentation.window_value = profile.settings['window_value_calibration']
         laser_segmentation.refinement_method = profile.settings['refinement_calibration']
+        laser_segmentation.fused_enable = profile.settings['fused_extraction']
         pattern.rows = profile.settings['pattern_rows']
         pattern.columns = profile.settings['pattern_columns']
         pattern.square_width = profile.settings['pattern_square_width']
@@ -64,6 +64,7 @@ class ControlWorkbench(Workbench):
         image_capture.texture_mode.set_saturation(profile.settings['saturation_control'])
         image_capture.texture_mode.set_exposure(profile.settings['exposure_control'])
         image_capture.set_use_distortion(profile.settings['use_distortion'])
+        image_capture.set_undistort_points(False)
         width, height = driver.camera.get_resolution()
         calibration_data.set_resolution(width, height)
         calibration_data.camera_matrix = profile.settings['camera_matrix']
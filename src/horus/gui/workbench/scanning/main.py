@@ -5,12 +5,15 @@ __author__ = 'Jesús Arroyo Torrens <jesus.arroyo@bq.com>'
 __copyright__ = 'Copyright (C) 2014-2016 Mundo Reader S.L.'
 __license__ = 'GNU General Public License v2 http://www.gnu.org/licenses/gpl2.html'
 
+import os
 import struct
 import wx._core
 
 from horus.util import resources, profile
 
 from horus.engine.driver.camera import InputOutputError
+from horus.engine.scan.ciclop_scan import ScanError
+from horus.engine.scan.point_cloud_sink import PointCloudSink
 
 from horus.gui.engine import driver, image_capture, laser_segmentation, calibration_data, \
     ciclop_scan, current_video, point_cloud_roi
@@ -27,6 +30,7 @@ class ScanningWorkbench(Workbench):
 
         self.scanning = False
         self.toolbar_scan = toolbar_scan
+        self.point_cloud_sink = None
 
         # Elements
         self.play_tool = self.toolbar_scan.AddLabelTool(
@@ -112,7 +116,9 @@ class ScanningWorkbench(Workbench):
         laser_mode.saturation = profile.settings['saturation_laser_scanning']
         laser_mode.exposure = profile.settings['exposure_laser_scanning']
         image_capture.set_use_distortion(profile.settings['use_distortion'])
+        image_capture.set_undistort_points(profile.settings['undistort_points'])
         image_capture.set_remove_background(profile.settings['remove_background_scanning'])
+        image_capture.set_background_refresh(profile.settings['background_refresh_scanning'])
         laser_segmentation.red_channel = profile.settings['red_channel_scanning']
         laser_segmentation.threshold_enable = profile.settings['threshold_enable_scanning']
         laser_segmentation.threshold_value = profile.settings['threshold_value_scanning']
@@ -121,6 +127,7 @@ class ScanningWorkbench(Workbench):
         laser_segmentation.window_enable = profile.settings['window_enable_scanning']
         laser_segmentation.window_value = profile.settings['window_value_scanning']
         laser_segmentation.refinement_method = profile.settings['refinement_scanning']
+        laser_segmentation.fused_enable = profile.settings['fused_extraction']
         width, height = driver.camera.get_resolution()
         calibration_data.set_resolution(width, height)
         calibration_data.camera_matrix = profile.settings['camera_matrix']
@@ -135,12 +142,19 @@ class ScanningWorkbench(Workbench):
         use_laser = profile.settings['use_laser']
         ciclop_scan.set_use_left_laser(use_laser == 'Left' or use_laser == 'Both')
         ciclop_scan.set_use_right_laser(use_laser == 'Right' or use_laser == 'Both')
+        ciclop_scan.set_split_lasers(profile.settings['split_lasers'])
+        ciclop_scan.set_two_pass(profile.settings['two_pass'])
+        ciclop_scan.set_texture_keyframes(profile.settings['texture_keyframes'])
         ciclop_scan.motor_step = profile.settings['motor_step_scanning']
         ciclop_scan.motor_speed = profile.settings['motor_speed_scanning']
         ciclop_scan.motor_acceleration = profile.settings['motor_acceleration_scanning']
+        ciclop_scan.set_continuous(profile.settings['continuous_rotation'])
         ciclop_scan.color = struct.unpack(
             'BBB', profile.settings['point_cloud_color'].decode('hex'))
         ciclop_scan.set_scan_sleep(profile.settings['scan_sleep'])
+        ciclop_scan.set_process_workers(profile.settings['process_workers'])
+        ciclop_scan.set_compact_captures(profile.settings['compact_captures'])
+        ciclop_scan.set_organized(profile.settings['organized_scan'])
         point_cloud_roi.set_show_center(profile.settings['show_center'])
         point_cloud_roi.set_use_roi(profile.settings['use_roi'])
         point_cloud_roi.set_diameter(profile.settings['roi_diameter'])
@@ -163,6 +177,9 @@ class ScanningWorkbench(Workbench):
 
     def point_cloud_callback(self, range, progress, point_cloud):
         point_cloud = point_cloud_roi.mask_point_cloud(*point_cloud)
+        sink = self.point_cloud_sink
+        if sink is not None and point_cloud is not None:
+            sink.append(*point_cloud)
         wx.CallAfter(self._point_cloud_callback,
                      range, progress, point_cloud)
 
@@ -243,6 +260,12 @@ class ScanningWorkbench(Workbench):
         self.pages_collection['view_page'].combo_video_views.Show()
         self.scene_view.create_default_object()
         self.scene_view.set_show_delete_menu(False)
+        if profile.settings['stream_point_cloud']:
+            self.point_cloud_sink = PointCloudSink(
+                os.path.join(profile.get_base_path(), 'scan.ply'))
+            self.point_cloud_sink.open()
+            self.scene_view.set_object_stream(self.point_cloud_sink.filename)
+            self.scene_view.set_preview_step(profile.settings['preview_step'])
         self.gauge.SetValue(0)
         self.gauge.Show()
         self.scene_panel.Layout()
@@ -252,6 +275,7 @@ class ScanningWorkbench(Workbench):
         ret, result = response
         if ret:
             self.gauge.SetValue(self.gauge.GetRange())
+            self._load_organized_point_cloud()
             dlg = wx.MessageDialog(self,
                                    _("Scanning has finished. If you want to save your "
                                      "point cloud go to \"File > Save model\""),
@@ -277,6 +301,29 @@ class ScanningWorkbench(Workbench):
                     str(result), wx.OK | wx.ICON_ERROR)
                 dlg.ShowModal()
                 dlg.Destroy()
+            elif not isinstance(result, ScanError) and self.scanning:
+                # Capture error. Stopped scans are finished by the stop tool
+                self.scanning = False
+                self.on_scan_finished()
+                dlg = wx.MessageDialog(self, str(result), _("Scanning error"),
+                                       wx.OK | wx.ICON_ERROR)
+                dlg.ShowModal()
+                dlg.Destroy()
+
+    def _load_organized_point_cloud(self):
+        # Replace the scanned slices with the filtered organized result
+        point_cloud = ciclop_scan.organized_point_cloud()
+        if point_cloud is not None:
+            points, texture = point_cloud_roi.mask_point_cloud(*point_cloud)
+            self.scene_view.create_default_object()
+            sink = self.point_cloud_sink
+            if sink is not None:
+                # The streamed file also holds the filtered point cloud
+                sink.close()
+                sink.open()
+                sink.append(points, texture)
+                self.scene_view.set_object_stream(sink.filename)
+            self.scene_view.append_point_cloud(points, texture)
 
     def on_stop_tool_clicked(self, event):
         paused = ciclop_scan._inactive
@@ -301,6 +348,9 @@ class ScanningWorkbench(Workbench):
                 ciclop_scan.resume()
 
     def on_scan_finished(self):
+        if self.point_cloud_sink is not None:
+            self.point_cloud_sink.close()
+            self.point_cloud_sink = None
         self._enable_tool_scan(self.play_tool, True)
         self._enable_tool_scan(self.stop_tool, False)
         self._enable_tool_scan(self.pause_tool, False)
@@ -24,10 +24,25 @@ class ScanParameters(ExpandablePanel):
     def add_controls(self):
         self.add_control('capture_texture', CheckBox)
         self.add_control('use_laser', ComboBox)
+        self.add_control(
+            'split_lasers', CheckBox,
+            _("Capture both lasers in the same frame and split it at the "
+              "center of the platform. Requires the platform calibration"))
+        self.add_control(
+            'two_pass', CheckBox,
+            _("Capture the texture in a first revolution and the lasers in a "
+              "second one. Avoids switching the camera settings at each step"))
+        self.add_control(
+            'texture_keyframes', Slider,
+            _("Capture the texture only every n steps. The color of the other "
+              "steps is taken from the nearest texture rotated to its position"))
 
     def update_callbacks(self):
         self.update_callback('capture_texture', ciclop_scan.set_capture_texture)
         self.update_callback('use_laser', self.set_use_laser)
+        self.update_callback('split_lasers', ciclop_scan.set_split_lasers)
+        self.update_callback('two_pass', ciclop_scan.set_two_pass)
+        self.update_callback('texture_keyframes', ciclop_scan.set_texture_keyframes)
 
     def set_use_laser(self, value):
         ciclop_scan.set_use_left_laser(value == 'Left' or value == 'Both')
@@ -54,12 +69,18 @@ class RotatingPlatform(ExpandablePanel):
         self.add_control('motor_step_scanning', FloatTextBox)
         self.add_control('motor_speed_scanning', FloatTextBox)
         self.add_control('motor_acceleration_scanning', FloatTextBox)
+        self.add_control(
+            'continuous_rotation', CheckBox,
+            _("Turn the platform at the motor speed while capturing. "
+              "The angle between captures is the speed times the capture time. "
+              "The texture is taken from the laser-off frames, in laser mode"))
 
     def update_callbacks(self):
         self.update_callback('show_center', point_cloud_roi.set_show_center)
         self.update_callback('motor_step_scanning', ciclop_scan.set_motor_step)
         self.update_callback('motor_speed_scanning', ciclop_scan.set_motor_speed)
         self.update_callback('motor_acceleration_scanning', ciclop_scan.set_motor_acceleration)
+        self.update_callback('continuous_rotation', ciclop_scan.set_continuous)
 
     def on_selected(self):
         self.main.scene_view._view_roi = False
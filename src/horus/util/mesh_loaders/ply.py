@@ -11,12 +11,13 @@ PLY file point cloud loader.
     - Binary, which is easy and quick to read.
     - Ascii, which is harder to read, as can come with windows, mac and unix style newlines.
 
-This module also contains a function to save objects as an PLY file.
+This module also contains functions to save objects and point arrays as PLY files.
 
 http://en.wikipedia.org/wiki/PLY_(file_format)
 """
 
-import struct
+import os
+import itertools
 import numpy as np
 
 from horus import __version__
@@ -26,98 +27,146 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-def _load_ascii(mesh, stream, dtype, count):
-    fields = dtype.fields
+# PLY property types
+_types = {'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+          'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+          'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+          'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'}
 
-    v = 0
-    c = 0
+# Mesh arrays: (name, properties, type)
+_groups = [('v', ('x', 'y', 'z'), np.float32),
+           ('n', ('nx', 'ny', 'nz'), np.float32),
+           ('c', ('red', 'green', 'blue'), np.uint8),
+           ('c', ('diffuse_red', 'diffuse_green', 'diffuse_blue'), np.uint8)]
 
-    if 'c' in fields:
-        c += 3
-    if 'n' in fields:
-        c += 3
 
+def _vertex_dtype(properties, fm):
+    """Record type of the vertex element. Consecutive x y z, nx ny nz and
+       red green blue properties of the mesh type are grouped in a (3,) field,
+       so the mesh arrays are views of the records"""
+    fields = []
     i = 0
-    while i < count:
-        i += 1
-        data = stream.readline().split(' ')
-        if data is not None:
-            mesh._add_vertex(data[v], data[v + 1], data[v + 2], data[c], data[c + 1], data[c + 2])
-
-
-def _load_binary(mesh, stream, dtype, count):
-    data = np.fromfile(stream, dtype=dtype, count=count)
-
-    fields = dtype.fields
+    while i < len(properties):
+        _type, name = properties[i]
+        for group, names, dtype in _groups:
+            if tuple(p[1] for p in properties[i:i + 3]) == names and \
+               all(np.dtype(_types[p[0]]) == dtype for p in properties[i:i + 3]):
+                fields.append((group, fm + np.dtype(dtype).str[1:], (3,)))
+                i += 3
+                break
+        else:
+            fields.append((name, fm + _types[_type]))
+            i += 1
+    return np.dtype(fields)
+
+
+def _mesh_arrays(mesh, data, count):
+    names = data.dtype.names
+    for group, props, dtype in _groups:
+        if group in names:
+            array = data[group]
+        elif all(name in names for name in props):
+            array = np.array([data[name] for name in props], dtype).T
+        else:
+            continue
+        if not array.dtype.isnative:
+            array = array.astype(dtype)
+        if group == 'v':
+            mesh.vertexes = array
+        elif group == 'n':
+            mesh.normal = array
+        else:
+            mesh.colors = array
     mesh.vertex_count = count
+    if mesh.vertexes is None:
+        mesh.vertexes = np.zeros((count, 3), np.float32)
+    if mesh.colors is None:
+        mesh.colors = np.empty((count, 3), np.uint8)
+        mesh.colors.fill(255)
 
-    if 'v' in fields:
-        mesh.vertexes = data['v']
-    else:
-        mesh.vertexes = np.zeros((count, 3))
-
-    if 'n' in fields:
-        mesh.normal = data['n']
-    else:
-        mesh.normal = np.zeros((count, 3))
 
-    if 'c' in fields:
-        mesh.colors = data['c']
+def _load_ascii(mesh, stream, dtype, count):
+    # Parse all the vertex lines at once
+    values = np.fromstring(''.join(itertools.islice(stream, count)), sep=' ')
+    values = values.reshape(count, -1)
+    data = np.empty(count, dtype)
+    column = 0
+    for name in dtype.names:
+        shape = dtype.fields[name][0].shape
+        size = shape[0] if shape else 1
+        data[name] = values[:, column:column + size].reshape((count,) + shape)
+        column += size
+    _mesh_arrays(mesh, data, count)
+
+
+def _load_binary(mesh, filename, offset, dtype, count):
+    # Interrupted files can hold less records than the header count
+    available = (os.path.getsize(filename) - offset) // dtype.itemsize
+    if count > available:
+        logger.warning("Truncated file {0}: {1} of {2} vertices".format(
+            filename, available, count))
+        count = available
+    # Memory map the records: mesh arrays are views of the file
+    if count > 0:
+        data = np.memmap(filename, dtype=dtype, mode='c', offset=offset, shape=(count,))
     else:
-        mesh.colors = 255 * np.ones((count, 3))
+        data = np.zeros(0, dtype)
+    _mesh_arrays(mesh, data, count)
 
 
 def load_scene(filename):
     obj = model.Model(filename, is_point_cloud=True)
     m = obj._add_mesh()
     with open(filename, "rb") as f:
-        dtype = []
         count = 0
         format = None
-        line = None
-        header = ''
+        properties = []
+        element = None
+        header = []
 
-        while line != 'end_header\n' and line != '':
+        while True:
             line = f.readline()
-            header += line
-        # Discart faces
-        header = header.split('element face ')[0].split('\n')
+            if line == '':
+                break
+            header.append(line.strip())
+            if header[-1] == 'end_header':
+                break
+        offset = f.tell()
 
-        if header[0] == 'ply':
+        if len(header) > 0 and header[0] == 'ply':
 
             for line in header:
-                if 'format ' in line:
-                    format = line.split(' ')[1]
-                    break
-
-            if format is not None:
-                if format == 'ascii':
-                    fm = ''
-                elif format == 'binary_big_endian':
-                    fm = '>'
-                elif format == 'binary_little_endian':
-                    fm = '<'
-
-            df = {'float': fm + 'f', 'uchar': fm + 'B'}
-            dt = {'x': 'v', 'nx': 'n', 'red': 'c', 'alpha': 'a'}
-            ds = {'x': 3, 'nx': 3, 'red': 3, 'alpha': 1}
+                words = line.split()
+                if len(words) < 2:
+                    continue
+                if words[0] == 'format':
+                    format = words[1]
+                elif words[0] == 'element':
+                    element = words[1]
+                    if element == 'vertex':
+                        count = int(words[2])
+                elif words[0] == 'property' and element == 'vertex':
+                    if words[1] == 'list' or words[1] not in _types:
+                        logger.error("Error: unsupported vertex property: " + line)
+                        return None
+                    properties.append((words[1], words[2]))
+
+            if format == 'ascii':
+                fm = '='
+            elif format == 'binary_big_endian':
+                fm = '>'
+            elif format == 'binary_little_endian':
+                fm = '<'
+            else:
+                logger.error("Error: unknown format {0}".format(format))
+                return None
 
-            for line in header:
-                if 'element vertex ' in line:
-                    count = int(line.split('element vertex ')[1])
-                elif 'property ' in line:
-                    props = line.split(' ')
-                    if props[2] in dt.keys():
-                        dtype = dtype + [(dt[props[2]], df[props[1]], (ds[props[2]],))]
-
-            dtype = np.dtype(dtype)
-
-            if format is not None:
-                if format == 'ascii':
-                    m._prepare_vertex_count(count)
-                    _load_ascii(m, f, dtype, count)
-                elif format == 'binary_big_endian' or format == 'binary_little_endian':
-                    _load_binary(m, f, dtype, count)
+            dtype = _vertex_dtype(properties, fm)
+
+            if format == 'ascii':
+                _load_ascii(m, f, dtype, count)
+            else:
+                _load_binary(m, filename, offset, dtype, count)
             obj._post_process_after_load()
             return obj
 
@@ -127,41 +176,86 @@ def load_scene(filename):
 
 
 def save_scene(filename, _object):
+    _unmap(_object._mesh, filename)
     with open(filename, 'wb') as f:
         save_scene_stream(f, _object)
 
 
+def _unmap(mesh, filename):
+    # Copy the arrays mapped from the file before overwriting it
+    if mesh is not None:
+        for name in ['vertexes', 'colors', 'normal']:
+            array = getattr(mesh, name)
+            mapped = getattr(array, 'filename', None)
+            if mapped is not None and os.path.abspath(filename) == mapped:
+                setattr(mesh, name, np.array(array))
+
+
 def save_scene_stream(stream, _object):
     m = _object._mesh
 
-    binary = True
-
     if m is not None:
-        frame = "ply\n"
+        write_ply(stream, m.vertexes[:m.vertex_count], m.colors[:m.vertex_count],
+                  comment="Generated by Horus {0}".format(__version__))
+
+
+def write_ply(stream, vertexes, colors=None, normals=None, binary=True,
+              comment=None, chunk_size=1000000):
+    """Write (N, 3) vertexes with optional (N, 3) uchar colors and normals.
+       The vertex records are built with numpy and written in chunks"""
+    count = len(vertexes)
+    stream.write(write_header(count, colors is not None, normals is not None, binary, comment))
+
+    dtype = vertex_dtype(colors is not None, normals is not None)
+    fmt = ' '.join(['%.9g'] * 3 * (1 + (normals is not None)) + ['%d'] * 3 * (colors is not None))
+    for begin in xrange(0, count, chunk_size):
+        end = min(begin + chunk_size, count)
+        data = np.empty(end - begin, dtype)
+        data['v'] = vertexes[begin:end]
+        if normals is not None:
+            data['n'] = normals[begin:end]
+        if colors is not None:
+            data['c'] = colors[begin:end]
         if binary:
-            frame += "format binary_little_endian 1.0\n"
+            stream.write(data.tostring())
         else:
-            frame += "format ascii 1.0\n"
-        frame += "comment Generated by Horus {0}\n".format(__version__)
-        frame += "element vertex {0}\n".format(m.vertex_count)
-        frame += "property float x\n"
-        frame += "property float y\n"
-        frame += "property float z\n"
+            columns = [data[name].astype(np.float64) for name in dtype.names]
+            np.savetxt(stream, np.hstack(columns), fmt=fmt)
+
+
+def vertex_dtype(colors=True, normals=False):
+    """Record type of the vertexes written by write_ply"""
+    fields = [('v', '<f4', (3,))]
+    if normals:
+        fields.append(('n', '<f4', (3,)))
+    if colors:
+        fields.append(('c', 'u1', (3,)))
+    return np.dtype(fields)
+
+
+def write_header(count, colors=True, normals=False, binary=True, comment=None):
+    """PLY header of the vertexes written by write_ply. The count can be
+       a padded string to patch it later"""
+    frame = "ply\n"
+    if binary:
+        frame += "format binary_little_endian 1.0\n"
+    else:
+        frame += "format ascii 1.0\n"
+    if comment is not None:
+        frame += "comment {0}\n".format(comment)
+    frame += "element vertex {0}\n".format(count)
+    frame += "property float x\n"
+    frame += "property float y\n"
+    frame += "property float z\n"
+    if normals:
+        frame += "property float nx\n"
+        frame += "property float ny\n"
+        frame += "property float nz\n"
+    if colors:
         frame += "property uchar red\n"
         frame += "property uchar green\n"
         frame += "property uchar blue\n"
-        frame += "element face 0\n"
-        frame += "property list uchar int vertex_indices\n"
-        frame += "end_header\n"
-        stream.write(frame)
-        if m.vertex_count > 0:
-            if binary:
-                for i in xrange(m.vertex_count):
-                    stream.write(struct.pack("<fffBBB",
-                                             m.vertexes[i, 0], m.vertexes[i, 1], m.vertexes[i, 2],
-                                             m.colors[i, 0], m.colors[i, 1], m.colors[i, 2]))
-            else:
-                for i in xrange(m.vertex_count):
-                    stream.write("{0} {1} {2} {3} {4} {5}\n".format(
-                                 m.vertexes[i, 0], m.vertexes[i, 1], m.vertexes[i, 2],
-                                 m.colors[i, 0], m.colors[i, 1], m.colors[i, 2]))
+    frame += "element face 0\n"
+    frame += "property list uchar int vertex_indices\n"
+    frame += "end_header\n"
+    return frame
@@ -49,23 +49,25 @@ def _load_ascii(mesh, stream):
                     cnt = 0
 
 
-def _load_binary(mesh, stream):
+def _load_binary(mesh, filename, stream):
     # Skip the header
     stream.read(80 - 5)
     count = struct.unpack('<I', stream.read(4))[0]
 
     dtype = np.dtype([
-                    ('n', np.float32, (3,)),
-                    ('v', np.float32, (9,)),
+                    ('n', '<f4', (3,)),
+                    ('v', '<f4', (3, 3)),
                     ('atttr', '<i2', (1,))])
 
-    data = np.fromfile(stream, dtype=dtype, count=count)
-
+    # Memory map the facets and copy the vertexes in a single pass.
+    # Normals are computed from the vertexes after loading
     mesh.vertex_count = 3 * count
-    n = np.zeros((mesh.vertex_count / 3, 9), np.float32)
-    n[:, 0:3] = n[:, 3:6] = n[:, 6:9] = data['n']
-    mesh.normal = n.reshape(mesh.vertex_count, 3)
-    mesh.vertexes = np.reshape(data['v'], (mesh.vertex_count, 3))
+    if count > 0:
+        data = np.memmap(filename, dtype=dtype, mode='r', offset=84, shape=(count,))
+        mesh.vertexes = np.ascontiguousarray(data['v'], np.float32).reshape(-1, 3)
+        del data
+    else:
+        mesh.vertexes = np.zeros((0, 3), np.float32)
 
 
 def load_scene(filename):
@@ -75,6 +77,6 @@ def load_scene(filename):
         if f.read(5).lower() == "solid":
             _load_ascii(m, f)
         else:
-            _load_binary(m, f)
+            _load_binary(m, filename, f)
         obj._post_process_after_load()
         return obj
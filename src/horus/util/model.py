@@ -100,6 +100,9 @@ class Mesh(object):
     A "VBO" can be associated with this object, which is used for rendering this object.
     """
 
+    # Minimum number of vertexes added when the arrays grow
+    chunk_size = 65536
+
     def __init__(self, obj):
         self.vertexes = None
         self.colors = None
@@ -113,18 +116,45 @@ class Mesh(object):
         self.vertexes[n], self.colors[n] = (x, y, z), (r, g, b)
         self.vertex_count += 1
 
+    def _add_points(self, points, colors):
+        """Append a (3, N) block of points and its (3, N) colors"""
+        n = points.shape[1]
+        self._reserve(self.vertex_count + n)
+        self.vertexes[self.vertex_count:self.vertex_count + n] = points.T
+        self.colors[self.vertex_count:self.vertex_count + n] = colors.T
+        self.vertex_count += n
+
+    def _reserve(self, vertex_number):
+        # Grow the arrays in chunks, keeping the loaded vertexes
+        size = len(self.vertexes)
+        if vertex_number > size:
+            size = max(vertex_number, 2 * size, self.chunk_size)
+            self.vertexes = self._resize(self.vertexes, size)
+            if self.colors is not None:
+                self.colors = self._resize(self.colors, size)
+            if self.normal is not None:
+                self.normal = self._resize(self.normal, size)
+
+    def _resize(self, array, size):
+        ret = np.zeros((size, 3), array.dtype)
+        ret[:self.vertex_count] = array[:self.vertex_count]
+        return ret
+
     def _add_face(self, x0, y0, z0, x1, y1, z1, x2, y2, z2):
         n = self.vertex_count
         self.vertexes[n], self.vertexes[
             n + 1], self.vertexes[n + 2] = (x0, y0, z0), (x1, y1, z1), (x2, y2, z2)
         self.vertex_count += 3
 
-    def _prepare_vertex_count(self, vertex_number):
+    def _prepare_vertex_count(self, vertex_number, normals=True):
         # Set the amount of vertex before loading data in them. This way we can
-        # create the np arrays before we fill them.
+        # create the np arrays before we fill them. Point clouds have no normals
         self.vertexes = np.zeros((vertex_number, 3), np.float32)
-        self.colors = np.zeros((vertex_number, 3), np.int32)
-        self.normal = np.zeros((vertex_number, 3), np.float32)
+        self.colors = np.zeros((vertex_number, 3), np.uint8)
+        if normals:
+            self.normal = np.zeros((vertex_number, 3), np.float32)
+        else:
+            self.normal = None
         self.vertex_count = 0
 
     def _prepare_face_count(self, face_number):
@@ -245,6 +245,9 @@ class Settings(collections.MutableMapping):
         self._add_setting(
             Setting('remove_background_scanning', _('Remove background'),
                     'profile_settings', bool, True))
+        self._add_setting(
+            Setting('background_refresh_scanning', _('Background refresh'),
+                    'profile_settings', int, 1, min_value=1, max_value=20))
 
         self._add_setting(
             Setting('red_channel_scanning', _('Red channel'), 'profile_settings',
@@ -272,6 +275,8 @@ class Settings(collections.MutableMapping):
             Setting('refinement_scanning', _('Refinement'), 'profile_settings',
                     unicode, u'SGF',
                     possible_values=(u'None', u'SGF')))
+        self._add_setting(
+            Setting('fused_extraction', _('Fused extraction'), 'profile_settings', bool, True))
         _('Open')
         _('Enable open')
 
@@ -358,6 +363,14 @@ class Settings(collections.MutableMapping):
         self._add_setting(
             Setting('use_laser', _('Use laser'), 'profile_settings',
                     unicode, u'Both', possible_values=(u'Left', u'Right', u'Both')))
+        self._add_setting(
+            Setting('split_lasers', _('Single frame lasers'), 'profile_settings',
+                    bool, False))
+        self._add_setting(
+            Setting('two_pass', _('Two pass scan'), 'profile_settings', bool, False))
+        self._add_setting(
+            Setting('texture_keyframes', _('Texture every n steps'), 'profile_settings',
+                    int, 1, min_value=1, max_value=20))
 
         self._add_setting(
             Setting('motor_step_scanning', _(u'Step (º)'), 'profile_settings',
@@ -369,6 +382,10 @@ class Settings(collections.MutableMapping):
             Setting('motor_acceleration_scanning', _(u'Acceleration (º/s²)'), 'profile_settings',
                     float, 200.0, min_value=1.0, max_value=1000.0))
 
+        self._add_setting(
+            Setting('continuous_rotation', _('Continuous rotation'), 'profile_settings',
+                    bool, False))
+
         self._add_setting(
             Setting('show_center', _('Show center'), 'profile_settings', bool, True))
         self._add_setting(
@@ -385,7 +402,22 @@ class Settings(collections.MutableMapping):
 
         self._add_setting(
             Setting('scan_sleep', _(u'Wait time in each scan interval'), 'profile_settings',
-                    float, 50.0, min_value=0.0, max_value=1000.0))
+                    float, 0.0, min_value=0.0, max_value=1000.0))
+        self._add_setting(
+            Setting('process_workers', _(u'Process workers'), 'profile_settings',
+                    int, 0, min_value=0, max_value=16))
+        self._add_setting(
+            Setting('compact_captures', _(u'Compact captures'), 'profile_settings',
+                    bool, False))
+        self._add_setting(
+            Setting('organized_scan', _(u'Organized scan'), 'profile_settings',
+                    bool, False))
+        self._add_setting(
+            Setting('stream_point_cloud', _(u'Stream point cloud to disk'), 'profile_settings',
+                    bool, False))
+        self._add_setting(
+            Setting('preview_step', _(u'Preview one point every n'), 'profile_settings',
+                    int, 4, min_value=1, max_value=32))
 
         # Hack to translate combo boxes:
         _('Texture')
@@ -460,6 +492,9 @@ class Settings(collections.MutableMapping):
                                            buffer=np.array([0.0, 0.0, 0.0, 0.0, 0.0]))))
         self._add_setting(
             Setting('use_distortion', _('Use distortion'), 'calibration_settings', bool, False))
+        self._add_setting(
+            Setting('undistort_points', _('Undistort points'), 'calibration_settings',
+                    bool, True))
 
         self._add_setting(
             Setting('distance_left', _('Distance left (mm)'), 'calibration_settings', float, 0.0))
@@ -551,6 +586,14 @@ class Settings(collections.MutableMapping):
                     tooltip=_('Change the language of Horus. '
                               'Switching language will require a program restart')))
 
+        self._add_setting(
+            Setting('camera_grabber', _('Camera grabber'), 'preferences', bool, False))
+
+        self._add_setting(
+            Setting('frame_settle_enable', _('Measure frame settle'), 'preferences', bool, False))
+        self._add_setting(
+            Setting('frame_settle', _('Frame settle'), 'preferences', dict, {}))
+
         # Video flush values
         # - Linux
         self._add_setting(
@@ -0,0 +1,52 @@
+import time
+import unittest
+import numpy as np
+from horus.engine.driver.camera import Camera
+
+
+class FakeCapture(object):
+
+    def __init__(self):
+        self.count = 0
+
+    def read(self):
+        time.sleep(0.01)
+        self.count += 1
+        return True, np.ones((4, 6, 3), np.uint8) * (self.count % 256)
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        return 0
+
+
+class CameraGrabberTest(unittest.TestCase):
+
+    def setUp(self):
+        self.camera = Camera()
+        self.camera._capture = FakeCapture()
+        self.camera._is_connected = True
+        self.camera._frame_rate = 100
+        self.camera.start_grabber()
+
+    def tearDown(self):
+        self.camera.stop_grabber()
+
+    def test_capture_after(self):
+        time.sleep(0.05)
+        count = self.camera._capture.count
+        image = self.camera.capture_image()
+        self.assertEqual(image.shape, (6, 4, 3))
+        self.assertGreater(image[0, 0, 0], count)
+
+    def test_capture_flush(self):
+        # Frames exposed during the flush periods are skipped
+        after = time.time()
+        self.camera.capture_image(flush=3, after=after)
+        self.assertGreaterEqual(self.camera.last_timestamp, after + 0.03)
+
+    def test_stop_grabber(self):
+        self.camera.stop_grabber()
+        self.assertFalse(self.camera._grabbing)
+        self.assertIsNotNone(self.camera.capture_image())
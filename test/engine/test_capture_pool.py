@@ -0,0 +1,95 @@
+import unittest
+import numpy as np
+from horus.engine.scan.scan_capture import ScanCapture, compact_capture
+from horus.engine.scan.capture_pool import CapturePool, WorkersError, compute_capture, \
+    engine_config
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+from horus.engine.algorithms.point_cloud_generation import PointCloudGeneration
+from horus.engine.calibration.calibration_data import CalibrationData
+
+
+class CapturePoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calibration_data = CalibrationData()
+        self.calibration_data.set_resolution(64, 48)
+        self.calibration_data.camera_matrix = np.array(
+            [[100., 0., 32.], [0., 100., 24.], [0., 0., 1.]])
+        self.calibration_data.distortion_vector = np.zeros(5)
+        for i, normal in enumerate([[0.86, 0., 0.5], [-0.86, 0., 0.5]]):
+            self.calibration_data.laser_planes[i].distance = 140.
+            self.calibration_data.laser_planes[i].normal = np.array(normal)
+        self.calibration_data.platform_rotation = np.array(
+            [[0., 1., 0.], [0., 0., -1.], [-1., 0., 0.]])
+        self.calibration_data.platform_translation = np.array([5., 80., 320.])
+        self.pool = CapturePool(2)
+        self.pool.start(64, 48, engine_config(LaserSegmentation(), self.calibration_data))
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def test_results_order(self):
+        results = []
+        for k in xrange(10):
+            capture = ScanCapture()
+            capture.theta = k
+            capture.texture = np.zeros((48, 64, 3), np.uint8)
+            capture.lasers[0] = np.zeros((48, 64, 3), np.uint8)
+            capture.lasers[0][:, 10 + k, 0] = 255
+            self.pool.put(capture)
+            results += self.pool.get()
+        results += self.pool.join()
+        self.assertEqual(len(results), 10)
+        for k, (images, points, point_clouds) in enumerate(results):
+            u, v = points[0]
+            np.testing.assert_allclose(u, 10 + k)
+            self.assertIsNone(point_clouds[1])
+
+    def test_dead_workers(self):
+        for process in self.pool._processes:
+            process.terminate()
+            process.join()
+        # Captures fill the free slots, then no worker frees them
+        for k in xrange(4):
+            self.pool.put(self._capture())
+        self.assertRaises(WorkersError, self.pool.put, self._capture())
+
+    def _capture(self):
+        capture = ScanCapture()
+        capture.theta = 0.5
+        capture.texture = np.zeros((48, 64, 3), np.uint8)
+        capture.texture[:, :, 1] = 120
+        capture.lasers[1] = np.zeros((48, 64, 3), np.uint8)
+        capture.lasers[1][5:40, 30, 0] = 255
+        return capture
+
+    def test_compact_capture(self):
+        laser_segmentation = LaserSegmentation()
+        expected = compute_capture(self._capture(), laser_segmentation, PointCloudGeneration())
+        capture = compact_capture(self._capture(), laser_segmentation.compute_red_channel,
+                                  (20, 50, 2, 44))
+        self.assertEqual(capture.lasers[1].shape, (42, 30))
+        self.assertEqual(capture.texture.ndim, 1)
+        self.pool.put(capture)
+        images, points, point_clouds = self.pool.join()[0]
+        np.testing.assert_allclose(points[1][0], expected[1][1][0])
+        np.testing.assert_array_equal(points[1][1], expected[1][1][1])
+        np.testing.assert_array_equal(images[1], expected[0][1])
+        np.testing.assert_allclose(point_clouds[1][0], expected[2][1][0], rtol=1e-5)
+        np.testing.assert_allclose(point_clouds[1][1], expected[2][1][1], atol=2)
+
+    def test_compact_capture_origin(self):
+        # ROI anchored at the origin: no offset but a cropped frame
+        laser_segmentation = LaserSegmentation()
+        expected = compute_capture(self._capture(), laser_segmentation, PointCloudGeneration())
+        capture = compact_capture(self._capture(), laser_segmentation.compute_red_channel,
+                                  (0, 50, 0, 44))
+        self.assertEqual(capture.offset, (0, 0))
+        images, points, point_clouds = compute_capture(
+            capture, laser_segmentation, PointCloudGeneration())
+        self.assertEqual(images[1].shape, (48, 64))
+        self.pool.put(capture)
+        images, points, point_clouds = self.pool.join()[0]
+        self.assertEqual(images[1].shape, (48, 64))
+        np.testing.assert_array_equal(points[1][1], expected[1][1][1])
+        np.testing.assert_allclose(point_clouds[1][0], expected[2][1][0], rtol=1e-5)
@@ -0,0 +1,120 @@
+import Queue
+import unittest
+import threading
+from horus.engine.driver.channel import GcodeChannel, CommandExecutor, CommandFuture, \
+    CommandTimeout
+
+
+class FakePort(object):
+
+    def __init__(self):
+        self.written = Queue.Queue()
+        self.lines = Queue.Queue()
+
+    def write(self, data):
+        self.written.put(data)
+
+    def readline(self):
+        try:
+            return self.lines.get(timeout=0.05)
+        except Queue.Empty:
+            return ''
+
+
+class GcodeChannelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.port = FakePort()
+        self.channel = GcodeChannel(self.port, buffer_size=2)
+        self.channel.start()
+
+    def tearDown(self):
+        self.channel.stop()
+
+    def test_in_order_responses(self):
+        first = self.channel.send('M71T1')
+        second = self.channel.send('M50T1')
+        self.assertEqual(self.channel.pending(), 2)
+        self.port.lines.put('ok\r\n')
+        self.port.lines.put('512\r\n')
+        self.port.lines.put('ok\r\n')
+        self.assertEqual(first.wait(), 'ok\r\n')
+        self.assertEqual(second.wait(), '512\r\nok\r\n')
+        self.assertEqual(self.port.written.get(), 'M71T1\r\n')
+        self.assertEqual(self.port.written.get(), 'M50T1\r\n')
+
+    def test_partial_lines(self):
+        future = self.channel.send('M50T1')
+        # readline returns at the timeout with the data received
+        for data in ['51', '2\r\n', 'o', 'k\r\n']:
+            self.port.lines.put(data)
+        self.assertEqual(future.wait(1), '512\r\nok\r\n')
+
+    def test_discard(self):
+        first = self.channel.send('M71T1')
+        second = self.channel.send('M71T2')
+        self.channel.discard(first)
+        self.assertTrue(first.cancelled)
+        self.assertTrue(second.cancelled)
+        self.assertIsInstance(second.error, CommandTimeout)
+        self.assertEqual(self.channel.pending(), 0)
+        # The late response of the first command does not complete others
+        self.port.lines.put('ok\r\n')
+        self.assertTrue(self.channel.send('M70T1').cancelled)
+
+    def test_stop_cancels(self):
+        future = self.channel.send('G1X10')
+        self.channel.stop()
+        self.assertTrue(future.cancelled)
+        self.assertEqual(future.wait(), '')
+
+
+class CommandExecutorTest(unittest.TestCase):
+
+    def test_order_and_cancel(self):
+        executor = CommandExecutor()
+        blocker = threading.Event()
+        results = []
+        first = executor.submit(CommandFuture('a'), lambda: blocker.wait() and 'ok a')
+        second = executor.submit(CommandFuture('b', results.append), lambda: 'ok b')
+        third = executor.submit(CommandFuture('c', results.append), lambda: 'ok c')
+        third.cancel()
+        blocker.set()
+        self.assertEqual(first.wait(), 'ok a')
+        self.assertEqual(second.wait(), 'ok b')
+        self.assertEqual(third.wait(), '')
+        self.assertEqual(results, ['', 'ok b'])
+        executor.submit(CommandFuture('d'), lambda: 'ok d').wait()
+        self.assertEqual(executor.depth(), 0)
+
+    def test_concurrent_submit(self):
+        executor = CommandExecutor()
+        workers = []
+        futures = []
+
+        def submit(i):
+            futures.append(executor.submit(
+                CommandFuture(str(i)), lambda: workers.append(threading.current_thread())))
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in xrange(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for future in futures:
+            future.wait(1)
+        # All the commands run in the same worker
+        self.assertEqual(len(workers), 8)
+        self.assertEqual(len(set(workers)), 1)
+
+    def test_stop(self):
+        executor = CommandExecutor()
+        thread = executor._thread
+        first = executor.submit(CommandFuture('a'), lambda: 'ok a')
+        executor.stop()
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(first.done())
+        # Restart for a new connection
+        executor.start()
+        self.assertEqual(executor.submit(CommandFuture('b'), lambda: 'ok b').wait(1), 'ok b')
+        executor.stop()
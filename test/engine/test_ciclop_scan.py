@@ -0,0 +1,357 @@
+import shutil
+import tempfile
+import threading
+import unittest
+import numpy as np
+from horus.engine.driver.board import Board
+from horus.engine.driver.camera import Camera
+from horus.engine.driver.driver import Driver
+from horus.engine.driver.replay import ReplaySession
+from horus.engine.scan.ciclop_scan import CiclopScan
+from horus.engine.scan.scan_capture import ScanCapture
+from horus.engine.algorithms.image_capture import ImageCapture
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+from horus.engine.calibration.calibration_data import CalibrationData
+
+
+def color_image(value):
+    image = np.zeros((8, 8, 3), np.uint8)
+    image[:] = value
+    return image
+
+
+def laser_image(width, height, shift):
+    image = np.zeros((height, width, 3), np.uint8)
+    for v in xrange(height):
+        u = int(width / 2 + shift + 4 * np.sin(v / 8.))
+        image[v, u - 1:u + 2, 0] = 220
+    return image
+
+
+class FakeImageCapture(object):
+
+    """Frames of a solid color that grows at each texture capture"""
+
+    def __init__(self):
+        self.calls = []
+        self.stream = False
+
+    def capture_texture(self):
+        self.calls.append('texture')
+        return color_image(10 * self.calls.count('texture'))
+
+    def capture_lasers(self):
+        self.calls.append('lasers')
+        return [color_image(0), color_image(0)]
+
+    def flush_laser(self):
+        self.calls.append('flush')
+
+    def set_motion(self, motion):
+        pass
+
+
+class TwoPassTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scan = CiclopScan()
+        self.settings = dict(self.scan.__dict__)
+        self.scan.image_capture = FakeImageCapture()
+        self.scan.motor_step = 90
+        self.scan.is_scanning = True
+        self.scan._theta = 0
+        self.scan._keyframes = []
+        self.scan._pending_textures = []
+        self.scan._timings = dict.fromkeys(['texture', 'lasers', 'motion', 'step'], 0.0)
+        self.scan._captures_queue.queue.clear()
+
+    def tearDown(self):
+        self.scan._captures_queue.queue.clear()
+        self.scan.__dict__.update(self.settings)
+
+    def test_passes(self):
+        self.scan._capture_two_pass()
+        # All the textures, then all the lasers
+        calls = [call for call in self.scan.image_capture.calls if call != 'flush']
+        self.assertEqual(calls, ['texture'] * 4 + ['lasers'] * 4)
+        self.assertEqual(self.scan._progress, 8)
+        self.assertEqual(self.scan._range, 8)
+        # Lasers take the texture captured at the same theta
+        captures = list(self.scan._captures_queue.queue)
+        self.assertEqual([capture.theta for capture in captures],
+                         list(np.deg2rad([0, 90, 180, 270])))
+        for k, capture in enumerate(captures):
+            self.assertLessEqual(np.abs(capture.texture - 10. * (k + 1)).max(), 2)
+
+
+def fake_capture(step, texture=None):
+    capture = ScanCapture()
+    capture.theta = np.deg2rad(40 * step)
+    capture.texture = texture
+    return capture
+
+
+class TextureKeyframesTest(unittest.TestCase):
+
+    """Nine steps of 40 degrees with a keyframe every three steps"""
+
+    def setUp(self):
+        self.scan = CiclopScan()
+        self.settings = dict(self.scan.__dict__)
+        self.scan.color = (1, 2, 3)
+        self.scan._keyframes = []
+        self.scan._pending_textures = []
+        self.scan._compact_texture = (None, None)
+        self.scan._captures_queue.queue.clear()
+        self.captures = [fake_capture(k, color_image(k) if k % 3 == 0 else None)
+                         for k in xrange(9)]
+
+    def tearDown(self):
+        self.scan._captures_queue.queue.clear()
+        self.scan.__dict__.update(self.settings)
+
+    def _join(self):
+        ready = []
+        for capture in self.captures:
+            ready.append(self.scan._join_texture(capture))
+        ready.append(self.scan._join_texture(None))
+        return ready
+
+    def test_join(self):
+        ready = self._join()
+        # Captures wait for the next keyframe and keep their order
+        c = self.captures
+        self.assertEqual(ready, [[c[0]], [], [], [c[1], c[2], c[3]], [], [],
+                                 [c[4], c[5], c[6]], [], [], [c[7], c[8]]])
+        # Texture of the nearest keyframe. The first one is next to the last step
+        keyframes = [0, 0, 3, 3, 3, 6, 6, 6, 0]
+        for capture, k in zip(self.captures, keyframes):
+            self.assertIs(capture.texture, self.captures[k].texture)
+        for k in [1, 2, 4, 5, 7, 8]:
+            self.assertEqual(self.captures[k].texture_theta,
+                             self.captures[keyframes[k]].theta)
+
+    def test_flush_without_keyframes(self):
+        self.captures = [fake_capture(k) for k in xrange(3)]
+        ready = self._join()
+        self.assertEqual(ready, [[], [], [], self.captures])
+        calibration_data = self.scan.calibration_data
+        for capture in self.captures:
+            self.assertEqual(capture.texture.shape,
+                             (calibration_data.height, calibration_data.width, 3))
+            self.assertEqual(capture.texture[0, 0].tolist(), [1, 2, 3])
+            self.assertIsNone(capture.texture_theta)
+
+    def test_queue_compact(self):
+        self.scan.compact_captures = True
+        self.scan.point_cloud_roi.get_roi = lambda: None
+        self.addCleanup(delattr, self.scan.point_cloud_roi, 'get_roi')
+        for ready in self._join():
+            for capture in ready:
+                capture.lasers[0] = color_image(50)
+                self.scan._queue_capture(capture)
+        queued = list(self.scan._captures_queue.queue)
+        self.assertEqual(queued, sorted(self.captures, key=lambda c: c.theta))
+        # Consecutive captures with the same keyframe share its encoded texture
+        for group in [[0, 1], [2, 3, 4], [5, 6, 7], [8]]:
+            for k in group:
+                self.assertEqual(self.captures[k].texture.ndim, 1)
+                self.assertIs(self.captures[k].texture, self.captures[group[0]].texture)
+        self.assertEqual(len(set(id(c.texture) for c in self.captures)), 4)
+
+
+class ReplayScanTest(unittest.TestCase):
+
+    """Scan a replay session of 32x24 frames recorded every 9 degrees"""
+
+    step = 9.0
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self._record(32, 24)
+        self.calibration_data = CalibrationData()
+        self.calibration_data.set_resolution(32, 24)
+        self.calibration_data.camera_matrix = np.array(
+            [[50., 0., 16.], [0., 50., 12.], [0., 0., 1.]])
+        self.calibration_data.distortion_vector = np.zeros(5)
+        for i, normal in enumerate([[0.86, 0., 0.5], [-0.86, 0., 0.5]]):
+            self.calibration_data.laser_planes[i].distance = 140.
+            self.calibration_data.laser_planes[i].normal = np.array(normal)
+        self.calibration_data.platform_rotation = np.array(
+            [[0., 1., 0.], [0., 0., -1.], [-1., 0., 0.]])
+        self.calibration_data.platform_translation = np.array([5., 80., 320.])
+
+        self.laser_segmentation = LaserSegmentation()
+        self.segmentation = dict(self.laser_segmentation.__dict__)
+        self.laser_segmentation.threshold_enable = True
+        self.laser_segmentation.threshold_value = 50
+
+        self.driver = Driver()
+        self.driver.set_replay_session(self.path)
+        self.driver.camera.connect()
+        self.driver.board.connect()
+        self.driver.is_connected = True
+
+        self.image_capture = ImageCapture()
+        self.image_capture.set_flush_values(0, 0, 0)
+        self.image_capture.set_flush_stream_values(0, 0, 0)
+
+        self.scan = CiclopScan()
+        self.settings = dict(self.scan.__dict__)
+        self.scan.motor_step = self.step
+        self.scan.motor_speed = 200
+        self.scan.motor_acceleration = 200
+        self.results = []
+        self.scan.point_cloud_callback = lambda r, p, point_cloud: \
+            self.results.append(point_cloud)
+
+    def tearDown(self):
+        self.driver.board.disconnect()
+        self.driver.camera.disconnect()
+        self.driver.is_connected = False
+        self.driver.set_replay_session(None)
+        self.scan.__dict__.update(self.settings)
+        self.laser_segmentation.__dict__.update(self.segmentation)
+        for plane in self.calibration_data.laser_planes:
+            plane.normal = None
+            plane.distance = None
+        shutil.rmtree(self.path)
+
+    def _record(self, width, height):
+        board = Board()
+        camera = Camera()
+        session = ReplaySession(self.path)
+        for k in xrange(int(360 / self.step) + 1):
+            board._motor_position = k * self.step
+            for lasers in [[False, False], [True, False], [False, True]]:
+                board._laser_enabled = lasers
+                if lasers[0]:
+                    image = laser_image(width, height, -6)
+                elif lasers[1]:
+                    image = laser_image(width, height, 6)
+                else:
+                    image = np.zeros((height, width, 3), np.uint8)
+                    image[:, :, 1] = 10 + k
+                session.record(image, board, camera)
+        session.save()
+
+    def _run(self, result=(True, None)):
+        done = threading.Event()
+        response = []
+        self.scan.set_callbacks(None, None, lambda r: (response.append(r), done.set()))
+        self.scan.start()
+        self.assertTrue(done.wait(60))
+        self.assertEqual(response, [result])
+
+
+class CaptureErrorTest(ReplayScanTest):
+
+    def test_motion_error(self):
+        # The error of the capture thread ends the scan
+        error = IOError("Serial timeout")
+
+        def motor_move(*args, **kwargs):
+            raise error
+
+        self.driver.board.motor_move = motor_move
+        self._run((False, error))
+        self.assertFalse(self.scan.is_scanning)
+
+
+class ContinuousScanTest(ReplayScanTest):
+
+    def setUp(self):
+        ReplayScanTest.setUp(self)
+        self.scan.set_continuous(True)
+        self.commands = []
+        board = self.driver.board
+        queue_command = board.queue_command
+        board.queue_command = lambda req, callback=None: (
+            self.commands.append(req), queue_command(req, callback))[1]
+
+    def test_revolution(self):
+        self._run()
+        self.assertGreater(len(self.results), 0)
+        # The platform turns at the motor speed
+        self.assertIn("G1F200", self.commands)
+        self.assertEqual(self.driver.board._motion[2], 200)
+        self.assertGreaterEqual(abs(self.scan._theta), 360.0)
+
+    def test_texture(self):
+        # Laser-off frames give the texture without background removal
+        image_capture = self.scan.image_capture
+        self.addCleanup(image_capture.set_remove_background,
+                        image_capture.get_remove_background())
+        image_capture.set_remove_background(False)
+        self._run()
+        self.assertTrue(any(texture[1].any() for _, texture in self.results))
+        self.assertIn('M71T1', self.commands)
+        self.assertIn('M70T1', self.commands)
+
+    def test_no_frames(self):
+        # The scan ends with the motion if the camera fails
+        board = self.driver.board
+        self.driver.camera.capture_image = lambda *args, **kwargs: board.advance(0.1)
+        done = threading.Event()
+        response = []
+        self.scan.set_callbacks(None, None, lambda r: (response.append(r), done.set()))
+        self.scan.start()
+        self.assertTrue(done.wait(10))
+        self.assertFalse(response[0][0])
+        self.assertEqual(self.results, [])
+
+    def test_pause(self):
+        # Pause at the first result and resume from another thread
+        def callback(r, p, point_cloud):
+            self.results.append(point_cloud)
+            if len(self.results) == 1:
+                self.scan.pause()
+                threading.Timer(0.2, self.scan.resume).start()
+
+        self.scan.point_cloud_callback = callback
+        self._run()
+        # The platform is held while the scan is paused
+        self.assertIn('!', self.commands)
+        self.assertLess(self.commands.index('!'), self.commands.index('~'))
+
+
+class OrganizedScanTest(ReplayScanTest):
+
+    def setUp(self):
+        ReplayScanTest.setUp(self)
+        self.scan.set_organized(True)
+        self.scan.set_texture_keyframes(3)
+
+    def test_keyframes(self):
+        self._run()
+        self._check_thetas()
+
+    def test_workers(self):
+        self.scan.set_process_workers(2)
+        self._run()
+        self._check_thetas()
+
+    def _check_thetas(self):
+        range_image = self.scan.range_image
+        self.assertGreater(range_image.count(), 0)
+        # Each column is stored at the step of its theta
+        steps = np.nonzero(range_image.mask.any(axis=1))
+        theta = 2 * np.pi * steps[0] / range_image.steps
+        np.testing.assert_allclose(range_image.theta[steps], theta, atol=1e-6)
+        # Same points as the results, rotated with the theta of their capture
+        points = np.hstack([point_cloud[0] for point_cloud in self.results])
+        organized = range_image.point_cloud(self.scan.point_cloud_generation)[0]
+        self.assertEqual(points.shape, organized.shape)
+        np.testing.assert_allclose(_sorted(points), _sorted(organized), atol=1e-3)
+
+    def test_filter(self):
+        self._run()
+        count = self.scan.range_image.count()
+        points, texture = self.scan.organized_point_cloud()
+        self.assertEqual(points.shape, texture.shape)
+        self.assertEqual(points.shape[1], self.scan.range_image.count())
+        self.assertLessEqual(points.shape[1], count)
+
+
+def _sorted(points):
+    return points[:, np.lexsort(np.around(points, 3))]
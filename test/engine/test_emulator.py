@@ -0,0 +1,141 @@
+import time
+import unittest
+from horus.engine.driver.board import Board
+from horus.engine.driver.emulator import FirmwareEmulator
+
+
+class Parent(object):
+
+    def __init__(self):
+        self.unplugged = False
+
+
+class EmulatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = FirmwareEmulator()
+        self.emulator.start()
+        self.board = Board(Parent(), serial_name=self.emulator.serial_name)
+        self.board.connect()
+
+    def tearDown(self):
+        self.board.disconnect()
+        self.emulator.stop()
+
+    def test_connect(self):
+        self.assertTrue(self.board._is_connected)
+        self.assertIn('G50', self.emulator.commands)
+
+    def test_lasers(self):
+        self.board.laser_on(1)
+        self.assertEqual(self.emulator.lasers, [False, True])
+        self.board.lasers_off()
+        self.assertEqual(self.emulator.lasers, [False, False])
+
+    def test_motor(self):
+        self.board.motor_speed(200)
+        self.board.motor_acceleration(400)
+        self.board.motor_move(90)
+        self.assertEqual(self.emulator.speed, 200)
+        self.assertEqual(self.emulator.acceleration, 400)
+        self.assertEqual(self.emulator.position, 90)
+
+    def test_ldr_sensor(self):
+        self.assertEqual(self.board.ldr_sensor('1'), 512)
+
+    def test_unplug(self):
+        unplugged = []
+        self.board.set_unplug_callback(lambda: unplugged.append(True))
+        self.emulator.stop()
+        for i in xrange(3):
+            self.board.laser_on(i % 2)
+            self.board.laser_off(i % 2)
+        self.assertEqual(unplugged, [True])
+
+    def test_reconnect(self):
+        self.board.laser_on(0)
+        self.board.disconnect()
+        self.assertFalse(self.board._is_connected)
+        self.assertEqual(self.emulator.lasers, [False, False])
+        self.board.connect()
+        self.assertTrue(self.board._is_connected)
+        self.board.laser_on(1)
+        self.assertEqual(self.emulator.lasers, [False, True])
+
+    def test_throughput(self):
+        # Commands are written without waiting for the responses of the
+        # commands in flight
+        self.emulator.latency = 0.2
+        futures = [self.board.queue_command("M71T1")
+                   for i in xrange(self.board.buffer_size)]
+        self.assertEqual(self.board._channel.pending(), self.board.buffer_size)
+        for future in futures:
+            future.wait(5)
+        self.assertTrue(all(f.response.startswith('ok') for f in futures))
+        self.assertEqual(self.board._channel.pending(), 0)
+
+    def test_scan_step(self):
+        # Lasers switch while the platform moves
+        self.board.motor_speed(200)
+        self.board.motor_acceleration(200)
+        self.board.motor_move(90, nonblocking=True).wait(5)
+        self.board.laser_on(0)
+        self.assertTrue(self.emulator.is_moving())
+        self.assertEqual(self.emulator.lasers, [True, False])
+        self.board.motor_wait()
+        self.assertEqual(self.emulator.position, 90)
+
+    def test_motor_hold(self):
+        self.board.motor_speed(200)
+        self.board.motor_acceleration(200)
+        self.board.motor_move(90)
+        motion_end = self.board._motion_end
+        self.board.motor_hold()
+        # Real-time commands are not acknowledged
+        self.assertTrue(self._wait_for(lambda: self.emulator._hold is not None))
+        self.assertFalse(self.emulator.is_moving())
+        time.sleep(0.2)
+        self.board.motor_resume()
+        self.assertTrue(self._wait_for(lambda: self.emulator._hold is None))
+        self.assertTrue(self.emulator.is_moving())
+        # The rest of the motion is delayed by the hold
+        self.assertGreater(self.board._motion_end - motion_end, 0.2)
+        self.board.motor_wait()
+        self.assertLess(abs(self.emulator._motion_end - self.board._motion_end), 0.1)
+
+    def _wait_for(self, condition, timeout=5):
+        end = time.time() + timeout
+        while not condition():
+            if time.time() > end:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def test_unplug_failures(self):
+        # The channel error of a command counts as one failure
+        self.board.command_timeout = 0.2
+        self.emulator.stop()
+        self.board.laser_on(0)
+        self.assertEqual(self.board._tries, 1)
+        self.board.laser_off(0)
+        self.assertEqual(self.board._tries, 2)
+
+    def test_timeout(self):
+        self.board.command_timeout = 0.1
+        self.emulator.latency = 0.5
+        begin = time.time()
+        self.board.laser_on(0)
+        self.assertLess(time.time() - begin, 0.4)
+        self.assertEqual(self.board._tries, 1)
+        self.assertEqual(self.board._channel.pending(), 0)
+        # The late response cannot be matched: the channel fails
+        self.assertFalse(self.board._channel._running)
+
+    def test_motor_wait(self):
+        self.board.motor_speed(200)
+        self.board.motor_acceleration(200)
+        self.board.motor_move(90)
+        self.assertTrue(self.emulator.is_moving())
+        self.board.motor_wait()
+        # Motion end estimated from the send time, before the firmware reads it
+        self.assertLess(self.emulator._motion_end - time.time(), 0.02)
@@ -0,0 +1,23 @@
+import unittest
+import numpy as np
+from horus.engine.calibration.frame_settle import settle_frames
+
+
+class FrameSettleTest(unittest.TestCase):
+
+    def _frames(self, settle, count=10):
+        np.random.seed(0)
+        frames = []
+        for i in xrange(count):
+            frame = (np.random.rand(48, 64, 3) * 10).astype(np.uint8)
+            if i >= settle:
+                frame[:, 30:34, 0] = 200
+            frames.append(frame)
+        return frames
+
+    def test_settle_frames(self):
+        self.assertEqual(settle_frames(self._frames(0)), 0)
+        self.assertEqual(settle_frames(self._frames(3)), 3)
+
+    def test_not_settled(self):
+        self.assertEqual(settle_frames(self._frames(9)), 9)
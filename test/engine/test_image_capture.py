@@ -0,0 +1,112 @@
+import time
+import unittest
+import numpy as np
+from horus.engine.algorithms.image_capture import ImageCapture, BackgroundModel
+
+
+class ImageCaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.image_capture = ImageCapture()
+        self.planes = self.image_capture.calibration_data.laser_planes
+        self.image = np.zeros((4, 10, 3), np.uint8)
+        self.image[:, 2, 0] = 100
+        self.image[:, 7, 0] = 200
+
+    def tearDown(self):
+        for plane in self.planes:
+            plane.normal = None
+            plane.distance = None
+
+    def test_split_lasers(self):
+        self.planes[0].normal = None
+        self.planes[1].normal = None
+        images = self.image_capture.split_lasers(self.image, 5)
+        self.assertEqual(images[0][:, 2, 0].tolist(), [100] * 4)
+        self.assertEqual(images[0][:, 7, 0].tolist(), [0] * 4)
+        self.assertEqual(images[1][:, 2, 0].tolist(), [0] * 4)
+        self.assertEqual(images[1][:, 7, 0].tolist(), [200] * 4)
+
+    def test_split_lasers_side(self):
+        # Left laser plane on the right of the camera
+        self.planes[0].normal = np.array([-0.8, 0.0, 0.6])
+        self.planes[0].distance = -100.0
+        self.planes[1].normal = np.array([0.8, 0.0, 0.6])
+        self.planes[1].distance = -100.0
+        images = self.image_capture.split_lasers(self.image, 5)
+        self.assertEqual(images[0][:, 7, 0].tolist(), [200] * 4)
+        self.assertEqual(images[1][:, 2, 0].tolist(), [100] * 4)
+
+    def test_split_none(self):
+        self.assertEqual(self.image_capture.split_lasers(None, 5), [None, None])
+
+
+class BackgroundModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.model = BackgroundModel(refresh=3)
+        self.image = np.full((80, 320, 3), 10, np.uint8)
+
+    def test_refresh(self):
+        self.assertIsNone(self.model.get())
+        self.model.update(self.image)
+        self.assertIs(self.model.get(), self.image)
+        self.assertIs(self.model.get(), self.image)
+        self.assertIsNone(self.model.get())
+
+    def test_check_laser(self):
+        self.model.update(self.image)
+        laser = self.image.copy()
+        laser[:, 160:164, :] = 255
+        self.model.check(laser)
+        self.assertIs(self.model.get(), self.image)
+
+    def test_check_change(self):
+        self.model.update(self.image)
+        self.model.check(self.image + 50)
+        self.assertIsNone(self.model.get())
+
+
+class FakeCamera(object):
+
+    def __init__(self, grabbing):
+        self.grabbing = grabbing
+        self.calls = []
+
+    def is_grabbing(self):
+        return self.grabbing
+
+    def capture_image(self, flush=0, after=None):
+        self.calls.append((flush, after))
+
+
+class CaptureAfterMotionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.image_capture = ImageCapture()
+        self.driver = self.image_capture.driver
+        self.camera = self.driver.camera
+        self.waited = []
+
+    def tearDown(self):
+        self.driver.camera = self.camera
+        self.image_capture.set_motion(None)
+
+    def _capture(self, grabbing):
+        self.driver.camera = FakeCamera(grabbing)
+        self.image_capture.set_motion(lambda: self.waited.append(time.time()))
+        self.image_capture.capture_image(flush=3)
+        self.assertEqual(len(self.waited), 1)
+        return self.driver.camera.calls
+
+    def test_full_flush(self):
+        # Frames buffered during the motion are all flushed after it
+        self.assertEqual(self._capture(False), [(3, None)])
+
+    def test_grabber(self):
+        # Frames exposed after the motion end and the flush frames
+        calls = self._capture(True)
+        self.assertEqual(len(calls), 1)
+        flush, after = calls[0]
+        self.assertEqual(flush, 3)
+        self.assertGreaterEqual(after, self.waited[0])
@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+import scipy.ndimage
+from horus.engine.algorithms.laser_segmentation import LaserSegmentation
+from horus.engine.calibration.calibration_data import CalibrationData
+
+
+class LaserSegmentationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calibration_data = CalibrationData()
+        self.calibration_data.set_resolution(320, 240)
+        self.laser_segmentation = LaserSegmentation()
+        self.laser_segmentation.threshold_enable = True
+        self.laser_segmentation.threshold_value = 50
+        self.laser_segmentation.blur_enable = True
+        self.laser_segmentation.set_blur_value(2)
+        self.laser_segmentation.window_value = 5
+
+        np.random.seed(0)
+        self.image = (np.random.rand(240, 320, 3) * 60).astype(np.uint8)
+        for v in xrange(240):
+            u = int(160 + 60 * np.sin(v / 40.))
+            self.image[v, u - 2:u + 3, 0] = 220
+        self.image[50:80] = 0
+        self.image[100, :, 0] = 0
+        self.image[100, 2, 0] = 255
+
+    def tearDown(self):
+        self.laser_segmentation.fused_enable = False
+
+    def _compare(self):
+        self.laser_segmentation.fused_enable = False
+        (u0, v0), image0 = self.laser_segmentation.compute_2d_points(self.image)
+        self.laser_segmentation.fused_enable = True
+        (u1, v1), image1 = self.laser_segmentation.compute_2d_points(self.image)
+        np.testing.assert_array_equal(v0, v1)
+        np.testing.assert_allclose(u0, u1)
+        np.testing.assert_array_equal(image0, image1)
+
+    def test_fused_window(self):
+        self.laser_segmentation.window_enable = True
+        self._compare()
+
+    def test_fused_no_window(self):
+        self.laser_segmentation.window_enable = False
+        self._compare()
+
+    def test_sgf(self):
+        v = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 20, 21, 22, 40, 50, 51, 52, 53])
+        u = np.random.rand(len(v)) * 100
+        f, _ = self.laser_segmentation._sgf(u, v, None)
+        expected = np.concatenate((scipy.ndimage.gaussian_filter(u[:12], sigma=2.0),
+                                   scipy.ndimage.gaussian_filter(u[12:15], sigma=2.0),
+                                   scipy.ndimage.gaussian_filter(u[15:16], sigma=2.0),
+                                   scipy.ndimage.gaussian_filter(u[16:], sigma=2.0)))
+        np.testing.assert_allclose(f, expected)
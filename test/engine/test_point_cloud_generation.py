@@ -0,0 +1,84 @@
+import unittest
+import numpy as np
+from horus.engine.algorithms.point_cloud_generation import PointCloudGeneration
+from horus.engine.calibration.calibration_data import CalibrationData
+
+
+class PointCloudGenerationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calibration_data = CalibrationData()
+        self.calibration_data.set_resolution(960, 1280)
+        self.calibration_data.camera_matrix = np.array(
+            [[1430., 0., 480.], [0., 1430., 620.], [0., 0., 1.]])
+        self.calibration_data.distortion_vector = np.zeros(5)
+        for i, normal in enumerate([[0.87, 0.01, 0.49], [-0.86, -0.02, 0.51]]):
+            self.calibration_data.laser_planes[i].distance = 140.
+            self.calibration_data.laser_planes[i].normal = np.array(normal)
+        self.calibration_data.platform_rotation = np.array(
+            [[0., 1., 0.], [0.05, 0., -1.], [-1., 0., 0.05]])
+        self.calibration_data.platform_translation = np.array([5., 80., 320.])
+        self.point_cloud_generation = PointCloudGeneration()
+
+    def _expected(self, theta, points_2d, index):
+        R = np.matrix(self.calibration_data.platform_rotation)
+        t = np.matrix(self.calibration_data.platform_translation).T
+        Xwo = self.point_cloud_generation.compute_platform_point_cloud(points_2d, R, t, index)
+        c, s = np.cos(-theta), np.sin(-theta)
+        Rz = np.matrix([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+        return np.array(Rz * Xwo)
+
+    def test_compute_point_cloud(self):
+        v = np.arange(0, 1280, 3)
+        u = 300 + 50 * np.sin(v / 100.) + 0.25
+        for index in xrange(2):
+            for theta in [0, 0.3, 2.5]:
+                point_cloud = self.point_cloud_generation.compute_point_cloud(
+                    theta, (u, v), index)
+                expected = self._expected(theta, (u, v), index)
+                np.testing.assert_allclose(point_cloud, expected, rtol=1e-4, atol=1e-3)
+
+    def test_calibration_changed(self):
+        v = np.arange(0, 1280, 7)
+        u = 500 + 0 * v
+        self.point_cloud_generation.compute_point_cloud(0, (u, v), 0)
+        self.calibration_data.laser_planes[0].distance = 150.
+        point_cloud = self.point_cloud_generation.compute_point_cloud(0, (u, v), 0)
+        np.testing.assert_allclose(point_cloud, self._expected(0, (u, v), 0),
+                                   rtol=1e-4, atol=1e-3)
+
+    def test_float_rows(self):
+        v = np.arange(0, 1280, 5)
+        u = 400 + 30 * np.cos(v / 80.)
+        point_cloud = self.point_cloud_generation.compute_point_cloud(1.0, (u, v), 1)
+        point_cloud_float = self.point_cloud_generation.compute_point_cloud(
+            1.0, (u, v.astype(np.float64)), 1)
+        np.testing.assert_allclose(point_cloud, point_cloud_float, rtol=1e-4, atol=1e-3)
+
+    def test_undistort_points(self):
+        v = np.arange(0, 1280, 5)
+        u = 400 + 0 * v
+        self.calibration_data.distortion_vector = np.array([0.1, -0.2, 0., 0., 0.])
+        uu, vv = self.point_cloud_generation.undistort_points((u, v))
+        self.assertEqual(len(uu), len(u))
+        self.assertFalse(np.allclose(vv, v))
+        self.calibration_data.distortion_vector = np.zeros(5)
+
+    def test_project_point_cloud(self):
+        v = np.arange(0, 1280, 5)
+        u = 400 + 30 * np.cos(v / 80.)
+        point_cloud = self.point_cloud_generation.compute_point_cloud(0.7, (u, v), 0)
+        uu, vv = self.point_cloud_generation.project_point_cloud(point_cloud, 0.7)
+        np.testing.assert_allclose(uu, u, atol=1e-2)
+        np.testing.assert_allclose(vv, v, atol=1e-2)
+
+    def test_project_distorted(self):
+        v = np.arange(100, 1200, 5)
+        u = 400 + 30 * np.cos(v / 80.)
+        self.calibration_data.distortion_vector = np.array([0.1, -0.2, 0., 0., 0.])
+        points_2d = self.point_cloud_generation.undistort_points((u, v))
+        point_cloud = self.point_cloud_generation.compute_point_cloud(0.7, points_2d, 1)
+        uu, vv = self.point_cloud_generation.project_point_cloud(point_cloud, 0.7, True)
+        self.calibration_data.distortion_vector = np.zeros(5)
+        np.testing.assert_allclose(uu, u, atol=0.1)
+        np.testing.assert_allclose(vv, v, atol=0.1)
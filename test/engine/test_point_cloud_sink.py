@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from horus.engine.scan.point_cloud_sink import PointCloudSink
+from horus.util.mesh_loaders import ply
+
+
+class PointCloudSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'scan.ply')
+        self.sink = PointCloudSink(self.filename, buffer_size=10)
+        self.points = np.random.rand(3, 25).astype(np.float32) * 100
+        self.colors = (np.arange(75) % 256).astype(np.uint8).reshape(3, 25)
+
+    def tearDown(self):
+        self.sink.close()
+        shutil.rmtree(self.path)
+
+    def test_append(self):
+        self.sink.open()
+        for i in xrange(0, 25, 5):
+            self.sink.append(self.points[:, i:i + 5], self.colors[:, i:i + 5])
+        self.sink.close()
+        m = ply.load_scene(self.filename)._mesh
+        self.assertEqual(self.sink.count, 25)
+        np.testing.assert_array_equal(m.vertexes, self.points.T)
+        np.testing.assert_array_equal(m.colors, self.colors.T)
+
+    def test_interrupted(self):
+        # The file has the flushed points before closing
+        self.sink.open()
+        self.sink.append(self.points[:, :12], self.colors[:, :12])
+        self.sink.append(self.points[:, 12:15], self.colors[:, 12:15])
+        m = ply.load_scene(self.filename)._mesh
+        self.assertEqual(m.vertex_count, 12)
+        np.testing.assert_array_equal(m.vertexes, self.points[:, :12].T)
+
+    def test_reopen(self):
+        # Reopening replaces the streamed points
+        self.sink.open()
+        self.sink.append(self.points, self.colors)
+        self.sink.close()
+        self.sink.open()
+        self.sink.append(self.points[:, :5], self.colors[:, :5])
+        self.sink.close()
+        m = ply.load_scene(self.filename)._mesh
+        self.assertEqual(m.vertex_count, 5)
+        np.testing.assert_array_equal(m.vertexes, self.points[:, :5].T)
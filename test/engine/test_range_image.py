@@ -0,0 +1,58 @@
+import unittest
+import numpy as np
+from horus.engine.scan.range_image import RangeImage
+from horus.engine.algorithms.point_cloud_generation import PointCloudGeneration
+from horus.engine.calibration.calibration_data import CalibrationData
+
+
+class RangeImageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calibration_data = CalibrationData()
+        self.calibration_data.set_resolution(64, 48)
+        self.calibration_data.camera_matrix = np.array(
+            [[100., 0., 32.], [0., 100., 24.], [0., 0., 1.]])
+        self.calibration_data.distortion_vector = np.zeros(5)
+        for i, normal in enumerate([[0.86, 0., 0.5], [-0.86, 0., 0.5]]):
+            self.calibration_data.laser_planes[i].distance = 140.
+            self.calibration_data.laser_planes[i].normal = np.array(normal)
+        self.calibration_data.platform_rotation = np.array(
+            [[0., 1., 0.], [0., 0., -1.], [-1., 0., 0.]])
+        self.calibration_data.platform_translation = np.array([5., 80., 320.])
+        self.point_cloud_generation = PointCloudGeneration()
+        self.range_image = RangeImage(8, 48)
+        self.v = np.arange(10, 40)
+        self.u = 20 + 0.5 * np.sin(self.v / 5.)
+
+    def _fill(self, index=0):
+        for step in xrange(8):
+            theta = step * np.pi / 4
+            texture = np.tile(np.uint8(step), (3, len(self.v)))
+            self.range_image.add(theta, index, (self.u, self.v), texture)
+
+    def test_point_cloud(self):
+        self._fill()
+        point_cloud, texture = self.range_image.point_cloud(self.point_cloud_generation)
+        self.assertEqual(self.range_image.count(), 8 * 30)
+        self.assertEqual(point_cloud.shape, (3, 8 * 30))
+        expected = self.point_cloud_generation.compute_point_cloud(
+            np.pi / 4, (self.u, self.v), 0)
+        np.testing.assert_allclose(point_cloud[:, 30:60], expected, rtol=1e-4, atol=1e-3)
+        self.assertEqual(texture[:, 30:60].tolist(), [[1] * 30] * 3)
+
+    def test_filters(self):
+        self._fill()
+        self.range_image.add(0, 1, ([30], [5]))
+        self.range_image.u[3, 20, 0] += 10
+        self.assertEqual(self.range_image.remove_isolated(), 1)
+        self.assertEqual(self.range_image.remove_spikes(2), 1)
+        self.assertTrue(np.isnan(self.range_image.u[3, 20, 0]))
+        self.assertEqual(self.range_image.count(), 8 * 30 - 1)
+
+    def test_faces(self):
+        self._fill(1)
+        faces = self.range_image.faces()
+        # Closed revolution of 8 steps and 29 row quads
+        self.assertEqual(faces.shape, (2 * 8 * 29, 3))
+        self.assertEqual(faces.max(), 8 * 30 - 1)
+        self.assertEqual(len(np.unique(faces)), 8 * 30)
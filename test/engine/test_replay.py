@@ -0,0 +1,88 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from horus.engine.driver.board import Board
+from horus.engine.driver.camera import Camera
+from horus.engine.driver.driver import Driver
+from horus.engine.driver.replay import ReplaySession, ReplayBoard, ReplayCamera
+
+
+class Parent(object):
+
+    def __init__(self, board):
+        self.board = board
+        self.unplugged = False
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        board = Board()
+        camera = Camera()
+        session = ReplaySession(self.path)
+        for theta in [0.0, 0.45, 0.9]:
+            board._motor_position = theta
+            for lasers in [[False, False], [True, False], [False, True]]:
+                board._laser_enabled = lasers
+                image = np.zeros((8, 6, 3), np.uint8)
+                image[:, :, 0] = int(theta * 100)
+                image[:, :, 1] = lasers[0] * 100 + lasers[1] * 200
+                session.record(image, board, camera)
+        session.save()
+
+        session = ReplaySession(self.path)
+        session.load()
+        self.board = ReplayBoard(session=session)
+        self.camera = ReplayCamera(Parent(self.board), session)
+        self.board.connect()
+        self.camera.connect()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_resolution(self):
+        self.assertEqual(self.camera.get_resolution(), (6, 8))
+
+    def test_capture_image(self):
+        self.board.motor_move(0.45)
+        self.board.laser_on(1)
+        image = self.camera.capture_image()
+        self.assertEqual(image[0, 0, 0], 45)
+        self.assertEqual(image[0, 0, 1], 200)
+
+    def test_nearest_theta(self):
+        self.board.motor_move(-0.4)
+        image = self.camera.capture_image()
+        self.assertEqual(image[0, 0, 0], 0)
+        self.assertEqual(image[0, 0, 1], 0)
+
+
+class DriverReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        ReplaySession(self.path).save()
+        self.driver = Driver()
+        self.serial_name = self.driver.board.serial_name
+
+    def tearDown(self):
+        self.driver.set_replay_session(None)
+        self.driver.board.serial_name = self.serial_name
+        shutil.rmtree(self.path)
+
+    def test_restore_hardware(self):
+        board, camera = self.driver.board, self.driver.camera
+        board.serial_name = '/dev/ttyACM1'
+        self.driver.set_replay_session(self.path)
+        replay_board = self.driver.board
+        self.assertIsInstance(replay_board, ReplayBoard)
+        self.assertIsInstance(self.driver.camera, ReplayCamera)
+        self.driver.set_replay_session(None)
+        # The hardware board and camera keep their settings
+        self.assertIs(self.driver.board, board)
+        self.assertIs(self.driver.camera, camera)
+        self.assertEqual(board.serial_name, '/dev/ttyACM1')
+        # The worker thread of the replay board is stopped
+        self.assertIsNone(replay_board._executor._thread)
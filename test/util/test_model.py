@@ -0,0 +1,27 @@
+import unittest
+import numpy as np
+from horus.util.model import Model
+
+
+class MeshTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mesh = Model(None, is_point_cloud=True)._add_mesh()
+        self.mesh.chunk_size = 4
+        self.mesh._prepare_vertex_count(0, normals=False)
+
+    def test_add_points(self):
+        for k in xrange(5):
+            points = np.arange(9, dtype=np.float64).reshape(3, 3) + k
+            colors = np.full((3, 3), k, np.uint8)
+            self.mesh._add_points(points, colors)
+        self.assertEqual(self.mesh.vertex_count, 15)
+        self.assertGreaterEqual(len(self.mesh.vertexes), 15)
+        self.assertIsNone(self.mesh.normal)
+        self.assertEqual(self.mesh.colors.dtype, np.uint8)
+        np.testing.assert_array_equal(self.mesh.vertexes[12], [4, 7, 10])
+        np.testing.assert_array_equal(self.mesh.colors[:15, 0], np.repeat(np.arange(5), 3))
+
+    def test_add_empty(self):
+        self.mesh._add_points(np.zeros((3, 0)), np.zeros((3, 0), np.uint8))
+        self.assertEqual(self.mesh.vertex_count, 0)
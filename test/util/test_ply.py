@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from StringIO import StringIO
+from horus.util.mesh_loaders import ply
+
+
+class PlyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.vertexes = np.random.rand(10, 3).astype(np.float32) * 100
+        self.colors = (np.arange(30) * 7 % 256).astype(np.uint8).reshape(10, 3)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_write_binary(self):
+        filename = os.path.join(self.path, 'test.ply')
+        with open(filename, 'wb') as f:
+            ply.write_ply(f, self.vertexes, self.colors, chunk_size=3)
+        m = ply.load_scene(filename)._mesh
+        self.assertEqual(m.vertex_count, 10)
+        np.testing.assert_array_equal(m.vertexes, self.vertexes)
+        np.testing.assert_array_equal(m.colors, self.colors)
+
+    def test_write_ascii(self):
+        stream = StringIO()
+        normals = np.ones((10, 3), np.float32)
+        ply.write_ply(stream, self.vertexes, self.colors, normals, binary=False)
+        header, body = stream.getvalue().split('end_header\n')
+        self.assertIn('property float nx', header)
+        data = np.loadtxt(StringIO(body))
+        self.assertEqual(data.shape, (10, 9))
+        np.testing.assert_allclose(data[:, :3], self.vertexes)
+        np.testing.assert_array_equal(data[:, 3:6], normals)
+        np.testing.assert_array_equal(data[:, 6:], self.colors)
+
+    def test_load_ascii(self):
+        filename = os.path.join(self.path, 'test.ply')
+        with open(filename, 'wb') as f:
+            ply.write_ply(f, self.vertexes, self.colors, binary=False)
+        m = ply.load_scene(filename)._mesh
+        self.assertEqual(m.vertex_count, 10)
+        np.testing.assert_allclose(m.vertexes, self.vertexes)
+        np.testing.assert_array_equal(m.colors, self.colors)
+
+    def test_load_properties(self):
+        filename = os.path.join(self.path, 'test.ply')
+        data = np.empty(10, [('x', '>f8'), ('y', '>f8'), ('z', '>f8'),
+                             ('quality', '>i4'), ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+        data['x'], data['y'], data['z'] = self.vertexes.T
+        data['quality'] = 7
+        data['red'], data['green'], data['blue'] = self.colors.T
+        with open(filename, 'wb') as f:
+            f.write("ply\nformat binary_big_endian 1.0\nelement vertex 10\n"
+                    "property double x\nproperty double y\nproperty double z\n"
+                    "property int quality\nproperty uchar red\n"
+                    "property uchar green\nproperty uchar blue\nend_header\n")
+            f.write(data.tostring())
+        m = ply.load_scene(filename)._mesh
+        self.assertEqual(m.vertexes.dtype, np.float32)
+        np.testing.assert_allclose(m.vertexes, self.vertexes)
+        np.testing.assert_array_equal(m.colors, self.colors)
+
+    def test_save_mapped(self):
+        filename = os.path.join(self.path, 'test.ply')
+        with open(filename, 'wb') as f:
+            ply.write_ply(f, self.vertexes, self.colors)
+        obj = ply.load_scene(filename)
+        ply.save_scene(filename, obj)
+        m = ply.load_scene(filename)._mesh
+        np.testing.assert_array_equal(m.vertexes, self.vertexes)
+        np.testing.assert_array_equal(m.colors, self.colors)
+
+    def test_load_truncated(self):
+        # The header count of an interrupted file exceeds its records
+        filename = os.path.join(self.path, 'test.ply')
+        with open(filename, 'wb') as f:
+            ply.write_ply(f, self.vertexes, self.colors)
+        size = os.path.getsize(filename)
+        with open(filename, 'r+b') as f:
+            f.truncate(size - 2 * 15 - 4)
+        m = ply.load_scene(filename)._mesh
+        self.assertEqual(m.vertex_count, 7)
+        np.testing.assert_array_equal(m.vertexes, self.vertexes[:7])
+        np.testing.assert_array_equal(m.colors, self.colors[:7])